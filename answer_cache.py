@@ -0,0 +1,236 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did i me my we you your it its this that
+these those to of in on at for with about and or please can could would will tell show
+what what's whats which any some there here just now right currently me us our
+""".split())
+CONTRACTIONS = {"what's": "what is", "whats": "what is", "it's": "it is", "i'm": "i am"}
+EMBEDDING_DIMENSIONS = 512
+# Words that lean on earlier turns; a message using them means something
+# different in another conversation.
+REFERENCE_WORDS = frozenset("""
+it its they them their this that these those one ones there then he she him her his same other another
+first second third last previous again more else yes no ok okay sure
+""".split())
+# Context under which answers to self-contained questions are shared by
+# every session.
+SHARED_CONTEXT = "*"
+
+
+def normalize_message(text):
+    text = str(text).casefold()
+    for contraction, expanded in CONTRACTIONS.items():
+        text = text.replace(contraction, expanded)
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode()) % EMBEDDING_DIMENSIONS
+
+
+def embed(normalized):
+    """Sparse hashed bag of words and word trigrams, L2 normalized.
+
+    Cheap and local: close paraphrases and typos land near each other, while
+    questions about different films share few features.
+    """
+    words = [word for word in normalized.split() if word not in STOPWORDS] or normalized.split()
+    vector = {}
+    for word in words:
+        features = [f"w:{word}"] + [f"g:{gram}" for gram in _grams(word)]
+        weight = 1 / math.sqrt(len(features))
+        for feature in features:
+            bucket = _bucket(feature)
+            vector[bucket] = vector.get(bucket, 0.0) + weight
+    for first, second in zip(words, words[1:]):
+        bucket = _bucket(f"b:{first} {second}")
+        vector[bucket] = vector.get(bucket, 0.0) + 0.5
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    return {bucket: value / norm for bucket, value in vector.items()}
+
+
+def _grams(word):
+    padded = f"<{word}>"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(bucket, 0.0) for bucket, value in a.items())
+
+
+def context_key(message_history):
+    """Fingerprint of everything the model saw before the new user message."""
+    digest = hashlib.sha256(json.dumps(message_history, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    content: str
+    # Every message the original turn appended after the user message.
+    messages: list
+    versions: dict
+    expires_at: float
+    vector: dict = field(repr=False, default=None)
+    numbers: tuple = ()
+
+
+class AnswerCache:
+    """Finished answers keyed on the prior context and the user message.
+
+    A lookup first tries the exact normalized message, then the most similar
+    cached message under the same context. An answer is only served while
+    every cache entry it was built from still has the version it had then.
+
+    Answers to self-contained questions are also shared across sessions,
+    keyed on the message alone and validated by the tool data they used. A
+    question qualifies when it has no words that refer back to earlier turns
+    and the answer was built on tool data that the question itself names:
+    dependency_terms maps each dependency key to the terms (title, location)
+    that must appear in the message, or None when that is unknown.
+    """
+
+    def __init__(self, version, maxsize=1024, ttl=300, similarity=0.9, dependency_terms=None):
+        self.version = version
+        self.dependency_terms = dependency_terms
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get(self, context, message):
+        normalized = normalize_message(message)
+        now = time.time()
+        with self._lock:
+            for scope in (context, SHARED_CONTEXT):
+                key = (scope, normalized)
+                entry = self._entries.get(key)
+                similar = False
+                if entry is None:
+                    key, entry = self._most_similar(scope, normalized)
+                    similar = entry is not None
+                if entry is not None and not self._valid(entry, now):
+                    self._remove(key)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.similar_hits += similar
+                    self.shared_hits += scope == SHARED_CONTEXT
+                    return entry
+            self.misses += 1
+            return None
+
+    def set(self, context, message, messages, dependencies):
+        """Store a finished turn unless it used uncacheable tools or has no answer."""
+        content = next((m["content"] for m in reversed(messages) if m["role"] == "assistant" and m["content"]), None)
+        if not content or not dependencies.cacheable:
+            return None
+        now = time.time()
+        # The answer lives exactly as long as the freshest data it relied on.
+        expires_at = min(dependencies.versions.values(), default=now + self.ttl)
+        if expires_at <= now:
+            return None
+        normalized = normalize_message(message)
+        entry = CachedAnswer(
+            content, [dict(m) for m in messages], dict(dependencies.versions), expires_at,
+            embed(normalized), _numbers(normalized),
+        )
+        scopes = [context]
+        if self._shareable(normalized, entry.versions):
+            scopes.append(SHARED_CONTEXT)
+        with self._lock:
+            for scope in scopes:
+                key = (scope, normalized)
+                self._remove(key)
+                self._entries[key] = entry
+                self._contexts.setdefault(scope, set()).add(key)
+            self.stores += 1
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._contexts.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _shareable(self, normalized, versions):
+        words = set(normalized.split())
+        if not versions or self.dependency_terms is None or words & REFERENCE_WORDS:
+            return False
+        for key in versions:
+            terms = self.dependency_terms(key)
+            if terms is None:
+                return False
+            # Any word of a term will do: "dune" names "Dune: Part Two".
+            if not all(set(normalize_message(term).split()) & words for term in terms if term):
+                return False
+        return True
+
+    def _valid(self, entry, now):
+        if entry.expires_at <= now:
+            return False
+        return all(self.version(key) == version for key, version in entry.versions.items())
+
+    def _most_similar(self, context, normalized):
+        keys = self._contexts.get(context)
+        if not keys or self.similarity >= 1:
+            return None, None
+        vector, numbers = embed(normalized), _numbers(normalized)
+        best_key, best_score = None, self.similarity
+        for key in keys:
+            entry = self._entries[key]
+            # "Dune 2" and "Dune 3" are close in any embedding; numbers must agree.
+            if entry.numbers != numbers:
+                continue
+            score = cosine(vector, entry.vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key, self._entries.get(best_key)
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is not None:
+            keys = self._contexts[key[0]]
+            keys.discard(key)
+            if not keys:
+                del self._contexts[key[0]]
+
+
+def _numbers(normalized):
+    return tuple(sorted(re.findall(r"\d+", normalized)))
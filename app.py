@@ -1,22 +1,36 @@
 from dotenv import load_dotenv
 import os
+import asyncio
 import json
+import logging
+import re
 import chainlit as cl
-from movie_functions import get_now_playing_movies, get_showtimes, buy_ticket, confirm_ticket_purchase, get_reviews
+from movie_functions import resolve_movie, answer_cache, ANSWER_CACHE_ENABLED
+from answer_cache import context_key
+from tool_cache import track_dependencies
+from reservations import current_holder
+from session_store import sessions
+from movie_tools import registry, CHAT_TOOLS
+from tool_registry import ToolArgumentError
+from call_parser import parse_function_calls
+from review_gate import should_check_reviews
+from history import compact_history
+from streaming import BufferedStreamer
+import metrics
 
 import traceback
 
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+logger = logging.getLogger(__name__)
+
 # Note: If switching to LangSmith, uncomment the following, and replace @observe with @traceable
 # from langsmith.wrappers import wrap_openai
 # from langsmith import traceable
 # client = wrap_openai(openai.AsyncClient())
 
-from langfuse.decorators import observe
-from langfuse.openai import AsyncOpenAI
-
-client = AsyncOpenAI()
+from tracing import observe, get_openai_client
 
 gen_kwargs = {
     "model": "gpt-4o-mini",
@@ -24,6 +38,12 @@ gen_kwargs = {
     "max_tokens": 500
 }
 
+# Start the main completion while the review classifier is still running, and
+# only restart it when the classifier actually adds reviews to the context.
+SPECULATIVE_REVIEW_CHECK = os.getenv("SPECULATIVE_REVIEW_CHECK", "true").lower() == "true"
+# Skip the review classifier when local rules show it cannot usefully fire.
+REVIEW_PREFILTER = os.getenv("REVIEW_PREFILTER", "true").lower() == "true"
+
 SYSTEM_PROMPT = """\
 You are a helpful movie chatbot that helps people explore movies that are out in \
 theaters. If a user asks for recent information, output a function call and \
@@ -32,11 +52,9 @@ function call. Call functions using Python syntax in plain text, no code blocks.
 
 You have access to the following functions:
 
-get_now_playing_movies()
-get_showtimes(title, location)
-buy_ticket(theater, movie, showtime)
-confirm_ticket_purchase(theater, movie, showtime)
-"""
+""" + registry.signatures(CHAT_TOOLS) + "\n"
+
+CHAT_TOOL_NAMES = frozenset(CHAT_TOOLS)
 
 REVIEW_PROMPT = """\
 Based on the conversation, determine if the topic is about a specific movie. Determine if the user is asking a question that would be aided by knowing what critics are saying about the movie. Determine if the reviews for that movie have already been provided in the conversation. If so, do not fetch reviews.
@@ -56,125 +74,208 @@ rationale. Do not output as a code block.
 
 @observe
 @cl.on_chat_start
-def on_chat_start():
+async def on_chat_start():
     message_history = [{"role": "system", "content": SYSTEM_PROMPT}]
-    cl.user_session.set("message_history", message_history)
+    await sessions.reset(cl.context.session.id, message_history)
+
+@cl.on_chat_end
+async def on_chat_end():
+    # The history stays in the session store; it just leaves this process's memory.
+    await sessions.spill(cl.context.session.id)
+
+def call_key(function_name, arguments):
+    return f"{function_name}:{json.dumps(arguments, sort_keys=True)}"
+
+def start_eager_calls(text, pending_calls):
+    for call in parse_function_calls(text, CHAT_TOOL_NAMES):
+        if not registry.get(call.name).eager:
+            continue
+        try:
+            arguments = registry.get(call.name).bind(call.args, call.kwargs)
+        except ToolArgumentError:
+            continue
+        key = call_key(call.name, arguments)
+        if key not in pending_calls:
+            pending_calls[key] = asyncio.create_task(registry.dispatch(call.name, arguments))
+
+async def run_function_call(call, pending_calls):
+    try:
+        arguments = registry.get(call.name).bind(call.args, call.kwargs)
+    except ToolArgumentError as e:
+        error = f"Error processing {call.name}: {str(e)}"
+        logger.warning(error)
+        return error
+    logger.debug("Received args for %s: %s", call.name, arguments)
+    # Reuse the result if the call was already started while streaming.
+    task = pending_calls.pop(call_key(call.name, arguments), None)
+    return await (task or registry.dispatch(call.name, arguments))
 
 @observe
-async def generate_response(client, message_history, gen_kwargs):
+async def generate_response(client, message_history, gen_kwargs, pending_calls=None):
     response_message = cl.Message(content="")
+    streamer = BufferedStreamer(response_message)
+    content = []
     await response_message.send()
 
-    stream = await client.chat.completions.create(messages=message_history, stream=True, **gen_kwargs)
-    async for part in stream:
-        if token := part.choices[0].delta.content or "":
-            await response_message.stream_token(token)
-
+    try:
+        metrics.record_llm_call("stream")
+        stream = await client.chat.completions.create(
+            messages=compact_history(message_history), stream=True, stream_options={"include_usage": True}, **gen_kwargs
+        )
+        async for part in stream:
+            # With include_usage the last chunk carries the token counts and no choices.
+            metrics.record_usage(part.usage)
+            if not part.choices:
+                continue
+            if token := part.choices[0].delta.content or "":
+                await streamer.add(token)
+                content.append(token)
+                # A call can only have completed on a chunk with a closing paren.
+                if pending_calls is not None and ")" in token:
+                    start_eager_calls("".join(content), pending_calls)
+    except asyncio.CancelledError:
+        # A speculative response was superseded; take it back off the screen.
+        streamer.cancel()
+        await response_message.remove()
+        raise
+
+    await streamer.flush()
     await response_message.update()
 
     return response_message
 
+async def send_cached_response(content):
+    response_message = cl.Message(content="")
+    streamer = BufferedStreamer(response_message)
+    await response_message.send()
+    for token in re.findall(r"\s*\S+", content):
+        await streamer.add(token)
+    await streamer.flush()
+    await response_message.update()
+    return response_message
+
 @observe
+@metrics.timed_review_check
 async def check_for_review_call(client, message_history, gen_kwargs):
-    print("Checking for review call")
+    # The classifier and the prefilter see what the model sees.
+    message_history = compact_history(message_history)
+    if REVIEW_PREFILTER and not should_check_reviews(message_history):
+        logger.debug("Skipping review call")
+        return None
+    logger.debug("Checking for review call")
+    metrics.record_llm_call("review_check")
     response = await client.chat.completions.create(
         messages=[{"role": "system", "content": REVIEW_PROMPT}]+message_history[1:],
         **gen_kwargs
     )
+    metrics.record_usage(getattr(response, "usage", None))
 
     context_response = response.choices[0].message.content
-    print("Response text for review call: ", context_response)
+    logger.debug("Response text for review call: %s", context_response)
     try:
         context_json = json.loads(context_response)
         if context_json.get("fetch_reviews", False):
-            movie_id = context_json.get("id")
-            reviews = get_reviews(movie_id)
-            reviews = f"Reviews for {context_json.get('movie')} (ID: {movie_id}):\n\n{reviews}"
-            context_message = {"role": "system", "content": f"CONTEXT: {reviews}"}
-            message_history.append(context_message)
+            movie_id, movie_title = await resolve_movie(context_json.get("id"), context_json.get("movie"))
+            if movie_id is None:
+                return None
+            reviews = await registry.dispatch("get_reviews", {"movie_id": movie_id, "movie_title": movie_title})
+            reviews = f"Reviews for {movie_title or ''} (ID: {movie_id}):\n\n{reviews}"
+            return {"role": "system", "content": f"CONTEXT: {reviews}"}
     except json.JSONDecodeError:
-        print(f"Error parsing review call: {context_response}")
+        logger.warning("Error parsing review call: %s", context_response)
+    return None
+
+async def generate_response_with_review_check(client, message_history, gen_kwargs, pending_calls=None):
+    if not SPECULATIVE_REVIEW_CHECK:
+        if context_message := await check_for_review_call(client, message_history, gen_kwargs):
+            message_history.append(context_message)
+        return await generate_response(client, message_history, gen_kwargs, pending_calls)
+
+    review_task = asyncio.create_task(check_for_review_call(client, message_history, gen_kwargs))
+    response_task = asyncio.create_task(generate_response(client, list(message_history), gen_kwargs, pending_calls))
+    try:
+        try:
+            context_message = await review_task
+        except Exception as e:
+            logger.warning("Review check failed, keeping speculative response: %s", e)
+            context_message = None
+
+        if context_message is None:
+            return await response_task
+
+        # The reviews change what the answer should say, so restart it with them in context.
+        response_task.cancel()
+        # wait() never raises the task's own cancellation or error, so only a
+        # cancellation of this turn (the Stop button) propagates from here.
+        await asyncio.wait([response_task])
+        if not response_task.cancelled() and response_task.exception() is None:
+            await response_task.result().remove()
+    finally:
+        # No-ops once they are done; if this turn was cancelled, stop them too.
+        review_task.cancel()
+        response_task.cancel()
+    message_history.append(context_message)
+    return await generate_response(client, message_history, gen_kwargs, pending_calls)
 
 @cl.on_message
 @observe
 async def on_message(message: cl.Message):
-    message_history = cl.user_session.get("message_history", [])
+    turn = metrics.start_turn()
+    failed = True
+    try:
+        await answer_message(message, turn)
+        failed = False
+    finally:
+        metrics.finish_turn(turn, failed)
+
+async def answer_message(message, turn):
+    client = get_openai_client()
+    session_id = cl.context.session.id
+    # The stored history only grows; each request compacts what it resends
+    # to stay inside the token budget.
+    message_history = await sessions.load(session_id)
+    context = context_key(compact_history(message_history)) if ANSWER_CACHE_ENABLED else None
     message_history.append({"role": "user", "content": message.content})
+    await sessions.save(session_id, message_history)
+    # Ticket holds belong to the session that made them.
+    current_holder.set(session_id)
+
+    if context is not None and (cached := answer_cache.get(context, message.content)):
+        # Same question, same conversation so far and unchanged tool data.
+        turn.cached = True
+        await send_cached_response(cached.content)
+        message_history.extend(dict(m) for m in cached.messages)
+        await sessions.save(session_id, message_history)
+        return
+
+    turn_start = len(message_history)
+    with track_dependencies() as dependencies:
+        pending_calls = {}
+        response_message = await generate_response_with_review_check(client, message_history, gen_kwargs, pending_calls)
 
-    # Check for review call first
-    await check_for_review_call(client, message_history, gen_kwargs)
-
-    response_message = await generate_response(client, message_history, gen_kwargs)
-
-    response_message_content = response_message.content
-    message_history.append({"role": "assistant", "content": response_message_content})
-    cl.user_session.set("message_history", message_history)
-
-    while True:
-        if "get_now_playing_movies()" in response_message_content:
-            now_playing_movies = get_now_playing_movies()
-            message_history.append({"role": "system", "content": now_playing_movies})
-        elif "get_showtimes(" in response_message_content:
-            try:
-                start_index = response_message_content.find("get_showtimes(") + len("get_showtimes(")
-                end_index = response_message_content.find(")", start_index)
-                args = response_message_content[start_index:end_index].split(",")
-                print(f"Received args for get_showtimes: {args}")
-                title = args[0].strip().strip("\"")
-                location = args[1].strip().strip("\"")
-                print(f"Extracted title: {title}, location: {location}")
-                showtimes = get_showtimes(title, location)
-            except Exception as e:
-                error = f"Error processing get_showtimes: {str(e)}"
-                print(error)
-                showtimes = error
-
-            message_history.append({"role": "system", "content": showtimes})
-
-        elif "buy_ticket(" in response_message_content:
-            try:
-                start_index = response_message_content.find("buy_ticket(") + len("buy_ticket(")
-                end_index = response_message_content.find(")", start_index)
-                args = response_message_content[start_index:end_index].split(",")
-                print("Received args for buy_ticket: ", args)
-                theater = args[0].strip().strip("\"")
-                movie = args[1].strip().strip("\"")
-                showtime = args[2].strip().strip("\"")
-                print(f"Extracted theater: {theater}, movie: {movie}, showtime: {showtime}")
-
-                purchase_ticket = buy_ticket(theater, movie, showtime)
-            except Exception as e:
-                error = f"Error processing buy_ticket: {str(e)}"
-                print(error)
-                purchase_ticket = error
-
-            message_history.append({"role": "system", "content": purchase_ticket})
-        elif "confirm_ticket_purchase(" in response_message_content:
-            try:
-                start_index = response_message_content.find("confirm_ticket_purchase(") + len("confirm_ticket_purchase(")
-                end_index = response_message_content.find(")", start_index)
-                args = response_message_content[start_index:end_index].split(",")
-                print("Received args for confirm_ticket_purchase: ", args)
-                theater = args[0].strip().strip("\"")
-                movie = args[1].strip().strip("\"")
-                showtime = args[2].strip().strip("\"")
-                print(f"Extracted theater: {theater}, movie: {movie}, showtime: {showtime}")
-                confirm_purchase = confirm_ticket_purchase(theater, movie, showtime)
-            except Exception as e:
-                error = f"Error processing confirm_ticket_purchase: {str(e)}"
-                print(error)
-                confirm_purchase = error
-
-            message_history.append({"role": "system", "content": confirm_purchase})
-        else:
-            break
-
-        # Generate a response to the user with the added system messages
-        response_message = await generate_response(client, message_history, gen_kwargs)
         response_message_content = response_message.content
+        message_history.append({"role": "assistant", "content": response_message_content})
+        await sessions.save(session_id, message_history)
+
+        while calls := parse_function_calls(response_message_content, CHAT_TOOL_NAMES):
+            # Every call in the response runs together and is answered in one follow-up.
+            results = await asyncio.gather(*(run_function_call(call, pending_calls) for call in calls))
+            for result in results:
+                message_history.append({"role": "system", "content": result})
+
+            # Generate a response to the user with the added system messages
+            response_message = await generate_response(client, message_history, gen_kwargs, pending_calls)
+            response_message_content = response_message.content
+
+            message_history.append({"role": "assistant", "content": response_message.content})
+            await sessions.save(session_id, message_history)
+
+    if context is not None:
+        answer_cache.set(context, message.content, message_history[turn_start:], dependencies)
 
-        message_history.append({"role": "assistant", "content": response_message.content})
-        cl.user_session.set("message_history", message_history)
+if metrics.METRICS_PATH:
+    from chainlit.server import app as server_app
+    metrics.mount(server_app)
 
 if __name__ == "__main__":
     cl.main()
@@ -1,22 +1,35 @@
 from dotenv import load_dotenv
 import os
+import asyncio
 import json
+import logging
+import re
 import chainlit as cl
-from movie_functions import get_now_playing_movies, get_showtimes, buy_ticket, confirm_ticket_purchase, get_reviews
+from movie_functions import resolve_movie, answer_cache, ANSWER_CACHE_ENABLED
+from answer_cache import context_key
+from tool_cache import track_dependencies
+from reservations import current_holder
+from session_store import sessions
+from movie_tools import registry, CHAT_TOOLS, REVIEW_TOOLS
+from review_gate import should_check_reviews
+from history import compact_history
+from streaming import BufferedStreamer
+from tool_stream import StreamingToolExecutor
+import metrics
 
 import traceback
 
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+logger = logging.getLogger(__name__)
+
 # Note: If switching to LangSmith, uncomment the following, and replace @observe with @traceable
 # from langsmith.wrappers import wrap_openai
 # from langsmith import traceable
 # client = wrap_openai(openai.AsyncClient())
 
-from langfuse.decorators import observe
-from langfuse.openai import AsyncOpenAI
- 
-client = AsyncOpenAI()
+from tracing import observe, get_openai_client
 
 gen_kwargs = {
     "model": "gpt-4o-mini",
@@ -24,248 +37,233 @@ gen_kwargs = {
     "max_tokens": 500
 }
 
+# Start the main completion while the review classifier is still running, and
+# only restart it when the classifier actually adds reviews to the context.
+SPECULATIVE_REVIEW_CHECK = os.getenv("SPECULATIVE_REVIEW_CHECK", "true").lower() == "true"
+# Skip the review classifier when local rules show it cannot usefully fire.
+REVIEW_PREFILTER = os.getenv("REVIEW_PREFILTER", "true").lower() == "true"
+
 SYSTEM_PROMPT = """\
 You are a helpful movie chatbot that helps people explore movies that are out in \
 theaters. 
 """
 
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_now_playing_movies",
-            "description": "Get the movies that are playing now in theaters. Call this whenever the user wants to what are the movies showing in theaters, for example when a customer asks 'What are the movies playing now?'",
-            "parameters": {
-                "type": "object",
-                "properties": {},
-                "required": [],
-                "additionalProperties": False,
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_showtimes",
-            "description": "Get the showtimes for a movie. Call this whenever the user wants to know the showtimes for a movie, for example when a customer asks 'What are the showtimes for Avengers: Endgame? near San Francisco'",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "title": {
-                        "type": "string",
-                        "description": "The title of the movie.",
-                    },
-                    "location": {
-                        "type": "string",
-                        "description": "The location of the theater, for example 'San Francisco'.",
-                    },
-                },
-                "required": ["title", "location"],
-                "additionalProperties": False,
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "buy_ticket",
-            "description": "Buy a ticket for a movie. Call this whenever the user wants to buy a ticket for a movie, for example when a customer asks 'I want to buy a ticket for Avengers: Endgame at 7pm. Is that available?'",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "theater": {   
-                        "type": "string",
-                        "description": "The name of the theater, for example 'AMC Metreon 16'",
-                    },
-                    "movie": {
-                        "type": "string",
-                        "description": "The title of the movie, for example 'Avengers: Endgame'",
-                    },
-                    "showtime": {
-                        "type": "string",   
-                        "description": "The showtime for the movie, for example '7pm'",
-                    },
-                },
-                "required": ["theater", "movie", "showtime"],
-                "additionalProperties": False,
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "confirm_ticket_purchase",
-            "description": "Confirm a ticket purchase. Call this whenever the user wants to confirm a ticket purchase",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "theater": {
-                        "type": "string",
-                        "description": "The name of the theater, for example 'AMC Metreon 16'",
-                    },
-                    "movie": {
-                        "type": "string",
-                        "description": "The title of the movie, for example 'Avengers: Endgame'",
-                    },
-                    "showtime": {
-                        "type": "string",   
-                        "description": "The showtime for the movie, for example '7pm'",
-                    },
-                },
-                "required": ["theater", "movie", "showtime"],
-                "additionalProperties": False,
-            }
-        }
-    },
-]
+tools = registry.openai_tools(CHAT_TOOLS)
 
 REVIEW_PROMPT = """\
 Based on the conversation, determine if the topic is about a specific movie. Determine if the user is asking a question that would be aided by knowing what critics are saying about the movie. Determine if the reviews for that movie have already been provided in the conversation. If so, do not fetch reviews.
 """
-review_tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_reviews",
-            "description": "Evaluate the conversation, and determine if the user is asking for reviews for a movie. If so, provide the ID of the movie. If not, return null.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "movie_id": {
-                        "type": "integer",
-                        "description": "ID of the movie to fetch reviews for"
-                    },
-                    "movie_title": {
-                        "type": "string",
-                        "description": "Title of the movie to fetch reviews for"
-                    }
-                },
-                "required": ["movie_id"],
-                "additionalProperties": False,
-            }
-        }
-    },
-]
+review_tools = registry.openai_tools(REVIEW_TOOLS)
 
 @observe
 @cl.on_chat_start
-def on_chat_start():    
+async def on_chat_start():
     message_history = [{"role": "system", "content": SYSTEM_PROMPT}]
-    cl.user_session.set("message_history", message_history)
+    await sessions.reset(cl.context.session.id, message_history)
+
+@cl.on_chat_end
+async def on_chat_end():
+    # The history stays in the session store; it just leaves this process's memory.
+    await sessions.spill(cl.context.session.id)
 
 @observe
 async def handle_tool_calls(client, message_history, gen_kwargs):
     response_message = cl.Message(content="")
-    function_data = {"name": [], "arguments": []}
+    streamer = BufferedStreamer(response_message)
+    executor = StreamingToolExecutor(registry.dispatch, eager_tools=registry.eager_tools())
 
     # Commenting out the send() call to handle sending empty 
     #await response_message.send()
 
-    stream = await client.chat.completions.create(messages=message_history, tools=tools, stream=True, **gen_kwargs)
-    async for part in stream:
-        if part.choices[0].delta.tool_calls:
-            tool_call = part.choices[0].delta.tool_calls[0]
-            function_name = tool_call.function.name or ""
-            arguments = tool_call.function.arguments or ""
-            function_data["name"].append(function_name)
-            function_data["arguments"].append(arguments)
-        
-        if token := part.choices[0].delta.content or "":
-            await response_message.stream_token(token)
+    try:
+        metrics.record_llm_call("stream")
+        stream = await client.chat.completions.create(
+            messages=compact_history(message_history), tools=tools, stream=True, stream_options={"include_usage": True}, **gen_kwargs
+        )
+        async for part in stream:
+            # With include_usage the last chunk carries the token counts and no choices.
+            metrics.record_usage(part.usage)
+            if not part.choices:
+                continue
+            for tool_call in part.choices[0].delta.tool_calls or []:
+                executor.add(tool_call)
+            
+            if token := part.choices[0].delta.content or "":
+                await streamer.add(token)
+    except asyncio.CancelledError:
+        # A speculative response was superseded; take it back off the screen.
+        streamer.cancel()
+        executor.cancel()
+        await response_message.remove()
+        raise
     
+    await streamer.flush()
     await response_message.update()
 
-    function_data["name"] = ''.join(function_data["name"])
-    function_data["arguments"] = ''.join(function_data["arguments"])
-    return response_message, function_data
+    return response_message, executor.finish()
 
 
 @observe
 async def generate_response(client, message_history, gen_kwargs):
     response_message = cl.Message(content="")
+    streamer = BufferedStreamer(response_message)
     await response_message.send()
 
-    stream = await client.chat.completions.create(messages=message_history, stream=True, **gen_kwargs)
+    metrics.record_llm_call("stream")
+    stream = await client.chat.completions.create(
+        messages=compact_history(message_history), stream=True, stream_options={"include_usage": True}, **gen_kwargs
+    )
     async for part in stream:
+        metrics.record_usage(part.usage)
+        if not part.choices:
+            continue
         if token := part.choices[0].delta.content or "":
-            await response_message.stream_token(token)
+            await streamer.add(token)
     
+    await streamer.flush()
     await response_message.update()
 
     return response_message
 
+async def send_cached_response(content):
+    response_message = cl.Message(content="")
+    streamer = BufferedStreamer(response_message)
+    await response_message.send()
+    for token in re.findall(r"\s*\S+", content):
+        await streamer.add(token)
+    await streamer.flush()
+    await response_message.update()
+    return response_message
+
 @observe
+@metrics.timed_review_check
 async def check_for_review_call(client, message_history, gen_kwargs):
-    print("Checking for review call")
+    # The classifier and the prefilter see what the model sees.
+    message_history = compact_history(message_history)
+    if REVIEW_PREFILTER and not should_check_reviews(message_history):
+        logger.debug("Skipping review call")
+        return None
+    logger.debug("Checking for review call")
+    metrics.record_llm_call("review_check")
     response = await client.chat.completions.create(
         messages=[{"role": "system", "content": REVIEW_PROMPT}]+message_history[1:],
         tools=review_tools,
         **gen_kwargs
     )
+    metrics.record_usage(getattr(response, "usage", None))
     
     context_response = response.choices[0].message.content
-    print("Response text for review call: ", context_response)
-    print("Response: ", response)
+    logger.debug("Response text for review call: %s", context_response)
     if response.choices[0].finish_reason == "tool_calls":
         tool_call = response.choices[0].message.tool_calls[0]
-        print("Tool call: ", tool_call)
+        logger.debug("Tool call: %s", tool_call)
         arguments = json.loads(tool_call.function.arguments)
         function_name = tool_call.function.name
         if function_name == "get_reviews":
-            reviews = get_reviews(arguments.get('movie_id'))
-            reviews_content = f"Reviews for {arguments.get('movie_title', '')} (ID: {arguments.get('movie_id', '')}):\n\n{reviews}"
-            context_message = {"role": "system", "content": f"CONTEXT: {reviews_content}"}
+            movie_id, movie_title = await resolve_movie(arguments.get('movie_id'), arguments.get('movie_title'))
+            if movie_id is None:
+                return None
+            reviews = await registry.dispatch(function_name, {"movie_id": movie_id, "movie_title": movie_title})
+            reviews_content = f"Reviews for {movie_title or ''} (ID: {movie_id or ''}):\n\n{reviews}"
+            return {"role": "system", "content": f"CONTEXT: {reviews_content}"}
+    return None
+
+async def handle_tool_calls_with_review_check(client, message_history, gen_kwargs):
+    if not SPECULATIVE_REVIEW_CHECK:
+        if context_message := await check_for_review_call(client, message_history, gen_kwargs):
             message_history.append(context_message)
-       
+        return await handle_tool_calls(client, message_history, gen_kwargs)
+
+    review_task = asyncio.create_task(check_for_review_call(client, message_history, gen_kwargs))
+    response_task = asyncio.create_task(handle_tool_calls(client, list(message_history), gen_kwargs))
+    try:
+        try:
+            context_message = await review_task
+        except Exception as e:
+            logger.warning("Review check failed, keeping speculative response: %s", e)
+            context_message = None
+
+        if context_message is None:
+            return await response_task
+
+        # The reviews change what the answer should say, so restart it with them in context.
+        response_task.cancel()
+        # wait() never raises the task's own cancellation or error, so only a
+        # cancellation of this turn (the Stop button) propagates from here.
+        await asyncio.wait([response_task])
+        if not response_task.cancelled() and response_task.exception() is None:
+            await response_task.result()[0].remove()
+    finally:
+        # No-ops once they are done; if this turn was cancelled, stop them too.
+        review_task.cancel()
+        response_task.cancel()
+    message_history.append(context_message)
+    return await handle_tool_calls(client, message_history, gen_kwargs)
 
 @cl.on_message
 @observe
 async def on_message(message: cl.Message):
-    message_history = cl.user_session.get("message_history", [])
+    turn = metrics.start_turn()
+    failed = True
+    try:
+        await answer_message(message, turn)
+        failed = False
+    finally:
+        metrics.finish_turn(turn, failed)
+
+async def answer_message(message, turn):
+    client = get_openai_client()
+    session_id = cl.context.session.id
+    # The stored history only grows; each request compacts what it resends
+    # to stay inside the token budget.
+    message_history = await sessions.load(session_id)
+    context = context_key(compact_history(message_history)) if ANSWER_CACHE_ENABLED else None
     message_history.append({"role": "user", "content": message.content})
-    
-    # Check for review call first
-    await check_for_review_call(client, message_history, gen_kwargs)
-    
-    response_message, function_data = await handle_tool_calls(client, message_history, gen_kwargs)
-    print("Function data: ", function_data)
-    print("Response text: ", response_message.content)
-    if response_message.content:
-        message_history.append({"role": "assistant", "content": response_message.content})
-        cl.user_session.set("message_history", message_history)
-
-    while function_data["name"]:
-        function_name = function_data["name"]
-        if arguments := function_data["arguments"]:
-            arguments = json.loads(arguments)
-        print("Function name: ", function_name)
-        print("Arguments: ", arguments)
-        if function_name == "get_now_playing_movies":
-            now_playing_movies = get_now_playing_movies()
-            print("Now playing movies: added to message history")
-            message_history.append({"role": "system", "content": now_playing_movies})
-        elif function_name == "get_showtimes":
-            showtimes = get_showtimes(**arguments)
-            message_history.append({"role": "system", "content": showtimes})
-            print("Showtimes: added to message history")
-        elif function_name == "buy_ticket":
-            purchase_ticket = buy_ticket(**arguments)
-            message_history.append({"role": "system", "content": purchase_ticket})
-            print("Purchase ticket: added to message history")
-        elif function_name == "confirm_ticket_purchase":
-            confirm_purchase = confirm_ticket_purchase(**arguments)
-            message_history.append({"role": "system", "content": confirm_purchase})
-            print("Confirm purchase: added to message history")
-        else:
-            break
-        # Generate a response to the user with the added system messages 
-        response_message, function_data = await handle_tool_calls(client, message_history, gen_kwargs)
-        print("Function data in loop: ", function_data)
-        print("Response text in loop: ", response_message.content)
+    await sessions.save(session_id, message_history)
+    # Ticket holds belong to the session that made them.
+    current_holder.set(session_id)
+
+    if context is not None and (cached := answer_cache.get(context, message.content)):
+        # Same question, same conversation so far and unchanged tool data.
+        turn.cached = True
+        await send_cached_response(cached.content)
+        message_history.extend(dict(m) for m in cached.messages)
+        await sessions.save(session_id, message_history)
+        return
+
+    turn_start = len(message_history)
+    with track_dependencies() as dependencies:
+        response_message, tool_calls = await handle_tool_calls_with_review_check(client, message_history, gen_kwargs)
+        logger.debug("Tool calls: %s", [(call.name, call.arguments) for call in tool_calls])
+        logger.debug("Response text: %s", response_message.content)
         if response_message.content:
             message_history.append({"role": "assistant", "content": response_message.content})
-            cl.user_session.set("message_history", message_history)
+            await sessions.save(session_id, message_history)
+
+        while tool_calls:
+            # Run every call from this round together (eager ones are already in
+            # flight) and answer them all in a single follow-up completion.
+            results = await asyncio.gather(*(call.result() for call in tool_calls))
+            results = [(call, result) for call, result in zip(tool_calls, results) if result is not None]
+            if not results:
+                break
+            for call, result in results:
+                message_history.append({"role": "system", "content": result})
+                logger.debug("%s: added to message history", call.name)
+            # Generate a response to the user with the added system messages 
+            response_message, tool_calls = await handle_tool_calls(client, message_history, gen_kwargs)
+            logger.debug("Tool calls in loop: %s", [(call.name, call.arguments) for call in tool_calls])
+            logger.debug("Response text in loop: %s", response_message.content)
+            if response_message.content:
+                message_history.append({"role": "assistant", "content": response_message.content})
+                await sessions.save(session_id, message_history)
+
+    if context is not None:
+        answer_cache.set(context, message.content, message_history[turn_start:], dependencies)
 
+if metrics.METRICS_PATH:
+    from chainlit.server import app as server_app
+    metrics.mount(server_app)
 
 if __name__ == "__main__":
     cl.main()
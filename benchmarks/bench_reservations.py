@@ -0,0 +1,72 @@
+"""Throughput and correctness of the seat reservation engine under contention.
+
+    python -m benchmarks.bench_reservations --workers 16 --sessions 5000 --showings 20
+
+Each simulated session holds seats for a showing and confirms them. With
+--hot most sessions race for the same showing. Afterwards every showing is
+checked so that no seat was sold twice and none went missing.
+"""
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from reservations import ReservationEngine, ReservationError
+
+
+def run_session(engine, index, args):
+    rng = random.Random(index)
+    showing = 0 if args.hot and rng.random() < 0.8 else rng.randrange(args.showings)
+    theater, movie, showtime = f"Theater {showing % 5}", f"Movie {showing}", "7:30pm"
+    holder = f"session-{index}"
+    try:
+        engine.hold(theater, movie, showtime, holder, quantity=rng.randint(1, 4))
+    except ReservationError:
+        return "sold_out"
+    if rng.random() < args.abandon:
+        engine.release(theater, movie, showtime, holder)
+        return "released"
+    try:
+        engine.confirm(theater, movie, showtime, holder)
+    except ReservationError:
+        return "expired"
+    return "confirmed"
+
+
+def check(engine):
+    for showings, _ in engine._shards:
+        for showing in showings.values():
+            held = [seat for hold in showing.holds.values() for seat in hold.seats]
+            seats = showing.available + list(showing.sold) + held
+            assert len(seats) == len(set(seats)) == showing.capacity, "seat accounting is inconsistent"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--showings", type=int, default=20)
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--capacity", type=int, default=120)
+    parser.add_argument("--abandon", type=float, default=0.1, help="share of holds released instead of confirmed")
+    parser.add_argument("--hot", action="store_true", help="send 80%% of sessions to one showing")
+    args = parser.parse_args(argv)
+
+    engine = ReservationEngine(capacity=args.capacity, shards=args.shards)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        outcomes = list(pool.map(lambda index: run_session(engine, index, args), range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    check(engine)
+
+    counts = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+    print(f"{args.sessions} sessions in {elapsed:.3f}s ({args.sessions / elapsed:,.0f} sessions/s, "
+          f"{args.workers} threads, {args.shards} shards)")
+    print(f"outcomes: {counts}")
+    print("seat accounting: ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
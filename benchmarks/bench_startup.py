@@ -0,0 +1,89 @@
+"""Measure how long each app module takes to import in a fresh interpreter.
+
+    python -m benchmarks.bench_startup --runs 5
+
+Every run is a new process using `python -X importtime`, so the numbers
+match a cold worker start. The report gives the median cumulative import
+time for each module, its heaviest dependencies, and which of the
+optional dependencies that should load lazily were imported anyway.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "tool_cache", "history", "metrics", "tracing", "movie_index", "upstream", "reservations",
+    "showtime_store", "answer_cache", "movie_functions", "movie_tools", "app", "app_tools",
+]
+# Should not be imported until the first turn that needs them.
+LAZY = ["serpapi", "langfuse", "openai", "tiktoken"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_once(module):
+    code = f"import sys, json; import {module}; print(json.dumps([m for m in {LAZY!r} if m in sys.modules]))"
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark")}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            # Indentation marks nesting; keep only top-level packages for the breakdown.
+            timings[name.strip()] = int(cumulative) / 1000
+    loaded_lazy = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall, timings, loaded_lazy
+
+
+def measure(module, runs, top):
+    walls, totals, dependencies, loaded_lazy = [], [], {}, set()
+    for _ in range(runs):
+        wall, timings, lazy = import_once(module)
+        walls.append(wall * 1000)
+        totals.append(timings.get(module, 0.0))
+        loaded_lazy.update(lazy)
+        for name, ms in timings.items():
+            if name != module and "." not in name:
+                dependencies.setdefault(name, []).append(ms)
+    heaviest = sorted(
+        ((name, statistics.median(values)) for name, values in dependencies.items()), key=lambda item: -item[1],
+    )[:top]
+    return {
+        "import_ms": round(statistics.median(totals), 1),
+        "process_ms": round(statistics.median(walls), 1),
+        "heaviest_ms": {name: round(ms, 1) for name, ms in heaviest},
+        "lazy_loaded_at_import": sorted(loaded_lazy),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="heaviest dependencies listed per module")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = {module: measure(module, args.runs, args.top) for module in args.modules}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
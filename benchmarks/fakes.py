@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+
+# Local stand-ins for OpenAI, TMDb, SerpAPI and the Chainlit session so the
+# app's on_message handlers can be driven without any network access.
+
+MOVIES = [
+    {"id": 1000 + index, "title": title, "release_date": "2024-03-01", "overview": f"{title} overview. " * 12}
+    for index, title in enumerate([
+        "Dune: Part Two", "Crouching Tiger, Hidden Dragon", "Kung Fu Panda 4", "Godzilla x Kong",
+        "Civil War", "Challengers", "The Fall Guy", "Inside Out 2", "Furiosa", "Bad Boys: Ride or Die",
+        "Twisters", "Deadpool & Wolverine", "Alien: Romulus", "Beetlejuice Beetlejuice", "Wicked",
+        "Gladiator II", "Moana 2", "Nosferatu", "Conclave", "Anora",
+    ])
+]
+THEATERS = ["AMC Metreon 16", "Alamo Drafthouse New Mission", "Regal Stonestown"]
+TIMES = ["1:00pm", "4:15pm", "7:30pm", "10:00pm"]
+
+upstream_calls = Counter()
+
+
+def find_movie(text):
+    text = text.casefold()
+    return next((movie for movie in MOVIES if movie["title"].casefold() in text), MOVIES[0])
+
+
+def _ns(**kwargs):
+    return SimpleNamespace(**kwargs)
+
+
+def _usage(messages, completion_tokens):
+    # Roughly four characters per token, which is close enough for a benchmark.
+    return _ns(prompt_tokens=len(json.dumps(messages)) // 4, completion_tokens=completion_tokens)
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class FakeCompletions:
+    def __init__(self, ttft_ms=300, token_ms=5, answer_tokens=60, classifier_ms=400):
+        self.ttft = ttft_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.answer_tokens = answer_tokens
+        self.classifier_delay = classifier_ms / 1000
+
+    async def create(self, messages, stream=False, tools=None, stream_options=None, **kwargs):
+        upstream_calls["openai_stream" if stream else "openai"] += 1
+        if not stream:
+            await asyncio.sleep(self.classifier_delay)
+            response = self._classify(messages, tools)
+            response.usage = _usage(messages, 20)
+            return response
+        return self._stream(messages, tools, (stream_options or {}).get("include_usage", False))
+
+    def _last_user(self, messages):
+        return next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+    def _classify(self, messages, tools):
+        text = self._last_user(messages).casefold()
+        wants_reviews = "good" in text or "review" in text
+        movie = find_movie(text)
+        if tools:
+            if wants_reviews:
+                arguments = json.dumps({"movie_id": movie["id"], "movie_title": movie["title"]})
+                tool_call = _ns(id="call_reviews", function=_ns(name="get_reviews", arguments=arguments))
+                return _ns(choices=[_ns(finish_reason="tool_calls", message=_ns(content=None, tool_calls=[tool_call]))])
+            return _ns(choices=[_ns(finish_reason="stop", message=_ns(content="No reviews needed.", tool_calls=None))])
+        content = json.dumps({
+            "movie": movie["title"], "id": movie["id"], "fetch_reviews": wants_reviews, "rationale": "benchmark",
+        })
+        return _ns(choices=[_ns(finish_reason="stop", message=_ns(content=content, tool_calls=None))])
+
+    def _plan_call(self, messages):
+        if messages[-1]["role"] != "user":
+            return None
+        lowered = messages[-1]["content"].casefold()
+        # "Yes, confirm it" refers back to the film from earlier turns.
+        movie = find_movie(" ".join(m["content"] for m in messages if m["role"] == "user"))
+        if "playing" in lowered:
+            return "get_now_playing_movies", {}
+        if "showtimes" in lowered:
+            return "get_showtimes", {"title": movie["title"], "location": "San Francisco"}
+        if "buy" in lowered:
+            return "buy_ticket", {"theater": THEATERS[0], "movie": movie["title"], "showtime": TIMES[2]}
+        if "confirm" in lowered:
+            return "confirm_ticket_purchase", {"theater": THEATERS[0], "movie": movie["title"], "showtime": TIMES[2]}
+        return None
+
+    async def _stream(self, messages, tools, include_usage=False):
+        async for part in self._stream_parts(messages, tools):
+            yield part
+        if include_usage:
+            yield _ns(choices=[], usage=_usage(messages, self.answer_tokens))
+
+    async def _stream_parts(self, messages, tools):
+        await asyncio.sleep(self.ttft)
+        call = self._plan_call(messages)
+        if call and tools:
+            name, arguments = call
+            deltas = [_ns(index=0, id="call_0", function=_ns(name=name, arguments=""))]
+            deltas += [
+                _ns(index=0, id=None, function=_ns(name=None, arguments=chunk))
+                for chunk in _chunks(json.dumps(arguments), 8)
+            ]
+            for delta in deltas:
+                yield _ns(choices=[_ns(delta=_ns(content=None, tool_calls=[delta]), finish_reason=None)], usage=None)
+                await asyncio.sleep(self.token_delay)
+            return
+
+        if call:
+            name, arguments = call
+            text = f"{name}({', '.join(json.dumps(value) for value in arguments.values())})"
+        else:
+            text = " ".join(f"word{i}" for i in range(self.answer_tokens))
+        for token in _chunks(text, 5):
+            yield _ns(choices=[_ns(delta=_ns(content=token, tool_calls=None), finish_reason=None)], usage=None)
+            await asyncio.sleep(self.token_delay)
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, **latency):
+        self.chat = _ns(completions=FakeCompletions(**latency))
+
+
+def tmdb_client(latency_ms=120):
+    async def handler(request):
+        await asyncio.sleep(latency_ms / 1000)
+        path = request.url.path
+        if path.endswith("/now_playing"):
+            upstream_calls["tmdb_now_playing"] += 1
+            return httpx.Response(200, json={"results": MOVIES})
+        if path.endswith("/reviews"):
+            upstream_calls["tmdb_reviews"] += 1
+            reviews = [
+                {"author": f"critic{i}", "author_details": {"rating": i + 4}, "content": "A thoughtful review. " * 40,
+                 "created_at": "2024-03-02T00:00:00Z", "url": "https://example.com/review"}
+                for i in range(6)
+            ]
+            return httpx.Response(200, json={"results": reviews})
+        return httpx.Response(404, json={})
+
+    return httpx.AsyncClient(base_url="https://api.themoviedb.org/3", transport=httpx.MockTransport(handler))
+
+
+def serp_search(latency_ms=800):
+    def search(params):
+        upstream_calls["serpapi"] += 1
+        time.sleep(latency_ms / 1000)
+        title = params["q"].removeprefix("showtimes for ")
+        return {"showtimes": [
+            {"day": day, "theaters": [
+                {"name": theater, "showing": [{"time": TIMES, "type": "Standard"}]} for theater in THEATERS
+            ]}
+            for day in ["Today", "Tomorrow"]
+        ], "search_parameters": {"q": title}}
+
+    return search
+
+
+class TurnRecorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+        self.emits = 0
+
+    def token(self):
+        self.emits += 1
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+
+current_turn = contextvars.ContextVar("current_turn", default=None)
+current_session = contextvars.ContextVar("current_session")
+
+
+class FakeMessage:
+    def __init__(self, content="", **kwargs):
+        self.content = content
+
+    async def send(self):
+        return self
+
+    async def stream_token(self, token):
+        self.content += token
+        if (turn := current_turn.get()) is not None:
+            turn.token()
+
+    async def update(self):
+        return True
+
+    async def remove(self):
+        return True
+
+
+class FakeContext:
+    @property
+    def session(self):
+        return _ns(id=current_session.get()["id"])
+
+
+class FakeUserSession:
+    def get(self, key, default=None):
+        return current_session.get().get(key, default)
+
+    def set(self, key, value):
+        current_session.get()[key] = value
@@ -0,0 +1,168 @@
+"""Drive N simulated Chainlit sessions through app.py or app_tools.py offline.
+
+    python -m benchmarks.load_test --app app_tools --sessions 200
+
+OpenAI, TMDb and SerpAPI are replaced by local fakes with configurable
+latency, so the numbers reflect the app's own overhead and concurrency
+behaviour rather than the network.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import importlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import metrics
+import tracing
+from benchmarks import fakes
+
+SCRIPT = [
+    "What movies are playing now?",
+    "Is {title} any good?",
+    "What are the showtimes for {title} in San Francisco?",
+    "Buy a ticket for {title} at the 7:30pm showing",
+    "Yes, confirm it",
+    "Thanks!",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def make_session_store(kind):
+    import session_store
+
+    if kind == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+        return session_store.SessionStore(session_store.SQLiteBackend(path))
+    if kind == "redis":
+        return session_store.SessionStore(session_store.RedisBackend(session_store.LocalRedis()))
+    return session_store.SessionStore(session_store.MemoryBackend())
+
+
+def load_app(name, args):
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    import chainlit as cl
+    import movie_functions
+
+    cl.Message = fakes.FakeMessage
+    cl.user_session = fakes.FakeUserSession()
+    cl.context = fakes.FakeContext()
+    movie_functions.set_http_client(fakes.tmdb_client(args.tmdb_ms))
+    movie_functions.set_serp_search(fakes.serp_search(args.serp_ms))
+    if args.cold:
+        movie_functions.response_cache.clear()
+
+    app = importlib.import_module(name)
+    app.sessions = make_session_store(args.session_store)
+    app.ANSWER_CACHE_ENABLED = args.answer_cache
+    movie_functions.answer_cache.clear()
+    tracing.set_openai_client(fakes.FakeAsyncOpenAI(
+        ttft_ms=args.ttft_ms, token_ms=args.token_ms, classifier_ms=args.classifier_ms,
+    ))
+    return app
+
+
+async def run_session(app, index, args, turns):
+    await asyncio.sleep(index * args.ramp_ms / 1000)
+    session = {"id": f"session-{index}"}
+    fakes.current_session.set(session)
+    await app.on_chat_start()
+    # "hot" sends every session after the same film, as on a release night.
+    title = fakes.MOVIES[0 if args.hot else index % len(fakes.MOVIES)]["title"]
+    for line in SCRIPT[:args.turns]:
+        turn = fakes.TurnRecorder()
+        fakes.current_turn.set(turn)
+        await app.on_message(fakes.FakeMessage(content=line.format(title=title)))
+        turn.finished = time.perf_counter()
+        turns.append(turn)
+    return len(json.dumps(await app.sessions.load(session["id"])))
+
+
+async def run(args):
+    app = load_app(args.app, args)
+    fakes.upstream_calls.clear()
+    turns = []
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    # The app logs whole responses at debug level; keep that out of the report unless asked for.
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        history_bytes = await asyncio.gather(*(run_session(app, i, args, turns) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    resident = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    ttft = [(t.first_token - t.started) * 1000 for t in turns if t.first_token is not None]
+    latency = [(t.finished - t.started) * 1000 for t in turns]
+    report = {
+        "app": args.app,
+        "sessions": args.sessions,
+        "turns": len(turns),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(turns) / elapsed, 2),
+        "ttft_ms": {p: round(percentile(ttft, p), 1) for p in (50, 90, 99)},
+        "turn_latency_ms": {p: round(percentile(latency, p), 1) for p in (50, 90, 99)},
+        "mean_turn_latency_ms": round(statistics.fmean(latency), 1) if latency else 0.0,
+        "websocket_emits_per_turn": round(sum(t.emits for t in turns) / max(len(turns), 1), 1),
+        "upstream_calls": dict(sorted(fakes.upstream_calls.items())),
+        "memory_per_session_kb": round(resident / args.sessions / 1024, 1),
+        "history_bytes_per_session": round(statistics.fmean(history_bytes)),
+    }
+    report["llm_tokens_per_turn"] = {
+        kind: round(metrics.LLM_TOKENS.value(kind=kind) / max(len(turns), 1)) for kind in ("prompt", "completion")
+    }
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(metrics.render())
+    report["session_store"] = {**app.sessions.stats, "hot": app.sessions.hot_sessions()}
+    if args.answer_cache:
+        report["answer_cache"] = sys.modules["movie_functions"].answer_cache.stats()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app_tools", choices=["app", "app_tools"])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=len(SCRIPT))
+    parser.add_argument("--hot", action="store_true", help="every session asks about the same movie")
+    parser.add_argument("--cold", action="store_true", help="clear the upstream response cache first")
+    parser.add_argument("--session-store", default="memory", choices=["memory", "sqlite", "redis"])
+    parser.add_argument("--ramp-ms", type=float, default=0, help="delay between session starts")
+    parser.add_argument("--answer-cache", action="store_true", help="reuse answers to repeated questions")
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--classifier-ms", type=float, default=400)
+    parser.add_argument("--tmdb-ms", type=float, default=120)
+    parser.add_argument("--serp-ms", type=float, default=800)
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--metrics", help="write the Prometheus metrics to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import re
+from typing import NamedTuple
+
+CALL_START = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+KEYWORD = re.compile(r"\s*([A-Za-z_]\w*)\s*=(?!=)")
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "\\": "\\", "'": "'", '"': '"'}
+LITERALS = {"True": True, "False": False, "None": None}
+
+
+class FunctionCall(NamedTuple):
+    name: str
+    args: list
+    kwargs: dict
+    start: int
+    end: int
+
+
+def _bare_value(text):
+    text = text.strip()
+    if text in LITERALS:
+        return LITERALS[text]
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _closes_string(text, index):
+    """A quote only ends a value when the next non-space character ends the
+    argument, so an apostrophe inside 'Schindler's List' stays in the title."""
+    index += 1
+    while index < len(text) and text[index].isspace():
+        index += 1
+    return index >= len(text) or text[index] in ",)"
+
+
+def _parse_string(text, index):
+    quote = text[index]
+    chars = []
+    index += 1
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if char == "\\" and index + 1 < length:
+            chars.append(ESCAPES.get(text[index + 1], text[index + 1]))
+            index += 2
+        elif char == quote and _closes_string(text, index):
+            return "".join(chars), index + 1
+        else:
+            chars.append(char)
+            index += 1
+    return None, length
+
+
+def _parse_arguments(text, index):
+    """Parse from just after "(" up to the matching ")".
+
+    Returns (args, kwargs, end) or None when the call is not closed yet, which
+    is what a partially streamed response looks like.
+    """
+    args, kwargs = [], {}
+    length = len(text)
+    while True:
+        while index < length and text[index].isspace():
+            index += 1
+        if index >= length:
+            return None
+        if text[index] == ")":
+            return args, kwargs, index + 1
+
+        keyword = None
+        match = KEYWORD.match(text, index)
+        if match:
+            keyword = match.group(1)
+            index = match.end()
+            while index < length and text[index].isspace():
+                index += 1
+            if index >= length:
+                return None
+
+        if text[index] in "\"'":
+            value, index = _parse_string(text, index)
+            if value is None:
+                return None
+        else:
+            # Unquoted value: read to the next top-level "," or ")".
+            depth, start = 0, index
+            while index < length:
+                char = text[index]
+                if char == "(":
+                    depth += 1
+                elif char == ")":
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif char == "," and depth == 0:
+                    break
+                index += 1
+            if index >= length:
+                return None
+            value = _bare_value(text[start:index])
+
+        if keyword is None:
+            args.append(value)
+        else:
+            kwargs[keyword] = value
+
+        # A quoted value only ends before its separator, so just spaces remain.
+        while index < length and text[index].isspace():
+            index += 1
+        if index >= length:
+            return None
+        if text[index] == ",":
+            index += 1
+
+
+def parse_function_calls(text, names=None):
+    """Return every complete `name(arg, ...)` call in text, in order.
+
+    Arguments may be quoted with ' or " (backslash escapes are honoured),
+    given as keywords, or left bare. Only names in `names` are considered
+    when it is given.
+
+    >>> [c.args for c in parse_function_calls("get_showtimes('Crouching Tiger, Hidden Dragon', 'SF')")]
+    [['Crouching Tiger, Hidden Dragon', 'SF']]
+    >>> [c.args for c in parse_function_calls("get_showtimes('Godzilla (2014)', location='SF')")]
+    [['Godzilla (2014)']]
+    >>> [c.args for c in parse_function_calls("buy_ticket('AMC', 'Schindler's List', '7pm')")]
+    [['AMC', "Schindler's List", '7pm']]
+    >>> [c.args for c in parse_function_calls("get_showtimes(Dune: Part Two, San Francisco)")]
+    [['Dune: Part Two', 'San Francisco']]
+    """
+    calls = []
+    position = 0
+    while match := CALL_START.search(text, position):
+        name = match.group(1)
+        if names is not None and name not in names:
+            position = match.end()
+            continue
+        parsed = _parse_arguments(text, match.end())
+        if parsed is None:
+            position = match.end()
+            continue
+        args, kwargs, end = parsed
+        calls.append(FunctionCall(name, args, kwargs, match.start(), end))
+        position = end
+    return calls
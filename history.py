@@ -0,0 +1,103 @@
+import os
+from functools import lru_cache
+
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+# Tool output and CONTEXT messages from more than this many user turns ago are
+# summarized or dropped; the current turn is never touched.
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "2"))
+TOOL_SUMMARY_CHARS = int(os.getenv("TOOL_SUMMARY_CHARS", "300"))
+
+TRIMMED_MARKER = "[Earlier tool output trimmed]"
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # Loaded on first use: tiktoken reads (and may download) the BPE file.
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _count_text(text):
+    if (encoding := _get_encoding()) is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    if (encoding := _get_encoding()) is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens]).rstrip() + "..."
+    if len(text) <= max_tokens * 4:
+        return text
+    return text[:max_tokens * 4].rstrip() + "..."
+
+
+def count_tokens(message):
+    return _count_text(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_history_tokens(message_history):
+    return sum(count_tokens(message) for message in message_history)
+
+
+def _is_tool_output(message):
+    return message.get("role") == "system"
+
+
+def _summarize(message):
+    content = message.get("content") or ""
+    if content.startswith(TRIMMED_MARKER) or len(content) <= TOOL_SUMMARY_CHARS:
+        return message
+    return {**message, "content": f"{TRIMMED_MARKER} {content[:TOOL_SUMMARY_CHARS]}..."}
+
+
+def _split_turns(messages):
+    turns = []
+    for message in messages:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def compact_history(message_history, budget=None, keep_turns=None):
+    """Return a copy of the history that fits the token budget.
+
+    The first message (the system prompt) and the latest turn are kept as is.
+    Older CONTEXT messages are dropped, older tool output is clipped, and if
+    that is not enough whole turns are evicted oldest first.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    keep_turns = HISTORY_KEEP_TURNS if keep_turns is None else keep_turns
+    if len(message_history) <= 1:
+        return list(message_history)
+
+    system_prompt, turns = message_history[0], _split_turns(message_history[1:])
+    recent_start = max(len(turns) - keep_turns, 0)
+
+    compacted = []
+    for index, turn in enumerate(turns):
+        if index >= recent_start:
+            compacted.append(turn)
+            continue
+        old_turn = []
+        for message in turn:
+            if not _is_tool_output(message):
+                old_turn.append(message)
+            elif not (message.get("content") or "").startswith("CONTEXT:"):
+                old_turn.append(_summarize(message))
+        compacted.append(old_turn)
+
+    total = count_tokens(system_prompt) + sum(count_history_tokens(turn) for turn in compacted)
+    while total > budget and len(compacted) > 1:
+        total -= count_history_tokens(compacted.pop(0))
+
+    return [system_prompt] + [message for turn in compacted for message in turn]
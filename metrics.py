@@ -0,0 +1,239 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "movie_chat"
+# Served by the Chainlit server when set, e.g. to /metrics. Off by default:
+# the endpoint is unauthenticated and exposes internal cache and session stats.
+METRICS_PATH = os.getenv("METRICS_PATH", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.label_names), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.label_names, key), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _labels(self.label_names + ("le",), key + (bound,))
+                    samples.append((f"{self.name}_bucket", labels, bucket_count))
+                samples.append((f"{self.name}_bucket", _labels(self.label_names + ("le",), key + ("+Inf",)), count))
+                samples.append((f"{self.name}_sum", _labels(self.label_names, key), total))
+                samples.append((f"{self.name}_count", _labels(self.label_names, key), count))
+        return samples
+
+
+TURNS = Counter("turns_total", "Chat turns handled.", ["outcome"])
+TURN_SECONDS = Histogram("turn_duration_seconds", "Time from user message to the end of the last response.")
+TTFT_SECONDS = Histogram("time_to_first_token_seconds", "Time from user message to the first streamed token.")
+REVIEW_CHECK_SECONDS = Histogram("review_check_seconds", "Review classifier latency, including the review fetch.", ["outcome"])
+TOOL_SECONDS = Histogram("tool_duration_seconds", "Tool dispatch latency.", ["tool", "outcome"])
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Upstream API latency including retries.", ["upstream", "outcome"])
+LLM_REQUESTS = Counter("llm_requests_total", "OpenAI chat completion requests.", ["kind"])
+LLM_ROUND_TRIPS = Histogram("llm_round_trips", "OpenAI requests made per turn.", buckets=COUNT_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by OpenAI usage.", ["kind"])
+
+METRICS = [
+    TURNS, TURN_SECONDS, TTFT_SECONDS, REVIEW_CHECK_SECONDS, TOOL_SECONDS, UPSTREAM_SECONDS,
+    LLM_REQUESTS, LLM_ROUND_TRIPS, LLM_TOKENS,
+]
+# Stats dicts (cache hit ratios and the like) exported as gauges when scraped.
+_stats_sources = {}
+
+
+def register_stats(name, stats):
+    _stats_sources[name] = stats
+
+
+@dataclass
+class TurnMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    first_token: float = None
+    review_check: float = None
+    review_outcome: str = None
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tools: list = field(default_factory=list)
+    cached: bool = False
+
+
+_turn = contextvars.ContextVar("turn_metrics", default=None)
+
+
+def start_turn():
+    turn = TurnMetrics()
+    _turn.set(turn)
+    return turn
+
+
+def current_turn():
+    return _turn.get()
+
+
+def finish_turn(turn, failed=False):
+    duration = time.perf_counter() - turn.started
+    outcome = "error" if failed else "cached" if turn.cached else "ok"
+    TURNS.inc(outcome=outcome)
+    TURN_SECONDS.observe(duration)
+    LLM_ROUND_TRIPS.observe(turn.llm_calls)
+    ttft = None
+    if turn.first_token is not None:
+        ttft = turn.first_token - turn.started
+        TTFT_SECONDS.observe(ttft)
+    if logger.isEnabledFor(logging.INFO):
+        tools = ",".join(f"{name}:{seconds * 1000:.0f}ms" for name, seconds in turn.tools) or "-"
+        logger.info(
+            "turn outcome=%s duration_ms=%.0f ttft_ms=%s review_check_ms=%s review=%s llm_calls=%d "
+            "prompt_tokens=%d completion_tokens=%d tools=%s",
+            outcome, duration * 1000, _ms(ttft), _ms(turn.review_check), turn.review_outcome or "-",
+            turn.llm_calls, turn.prompt_tokens, turn.completion_tokens, tools,
+        )
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+def record_first_token():
+    turn = _turn.get()
+    if turn is not None and turn.first_token is None:
+        turn.first_token = time.perf_counter()
+
+
+def record_llm_call(kind):
+    LLM_REQUESTS.inc(kind=kind)
+    if (turn := _turn.get()) is not None:
+        turn.llm_calls += 1
+
+
+def record_usage(usage):
+    if usage is None:
+        return
+    prompt, completion = getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(prompt, kind="prompt")
+    LLM_TOKENS.inc(completion, kind="completion")
+    if (turn := _turn.get()) is not None:
+        turn.prompt_tokens += prompt
+        turn.completion_tokens += completion
+
+
+def record_tool(name, seconds, outcome):
+    TOOL_SECONDS.observe(seconds, tool=name, outcome=outcome)
+    if (turn := _turn.get()) is not None:
+        turn.tools.append((name, seconds))
+
+
+def record_upstream(name, seconds, outcome):
+    UPSTREAM_SECONDS.observe(seconds, upstream=name, outcome=outcome)
+
+
+def timed_review_check(func):
+    """Time a review check; a None result means no reviews were added."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await func(*args, **kwargs)
+            outcome = "none" if result is None else "reviews"
+            return result
+        finally:
+            seconds = time.perf_counter() - started
+            REVIEW_CHECK_SECONDS.observe(seconds, outcome=outcome)
+            if (turn := _turn.get()) is not None:
+                turn.review_check, turn.review_outcome = seconds, outcome
+    return wrapper
+
+
+def render():
+    """Everything collected so far in the Prometheus text format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    for source, stats in _stats_sources.items():
+        for key, value in stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"{METRICS_PREFIX}_{source}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def mount(server_app, path=None):
+    """Serve render() from the Chainlit server, ahead of its catch-all route."""
+    path = METRICS_PATH if path is None else path
+    if not path or any(getattr(route, "path", None) == path for route in server_app.router.routes):
+        return
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    async def endpoint(request):
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+    server_app.router.routes.insert(0, Route(path, endpoint, methods=["GET"]))
@@ -1,47 +1,244 @@
 import os
-import requests
-from serpapi import GoogleSearch
-import os
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import metrics
+from tool_cache import TTLCache, SQLiteBackend, SingleFlight, MISSING, mark_uncacheable, record_dependency
+from history import truncate_to_tokens
+from answer_cache import AnswerCache
+from movie_index import MovieIndex
+from prefetch import Prefetcher
+from upstream import UpstreamPolicy, UpstreamError, RetryableError
+from showtime_store import ShowtimeStore
+from reservations import (
+    reservations, current_holder, ReservationError, SoldOutError, NoHoldError, HoldExpiredError,
+)
 
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+
+# One pooled keep-alive client shared by every session in the process, and a
+# bounded pool for the upstream libraries that only offer a blocking API.
+_http_client = None
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("UPSTREAM_MAX_THREADS", "16")),
+    thread_name_prefix="upstream",
+)
+
+
+# Seconds each kind of upstream answer stays fresh. Now playing changes about
+# once a day and reviews rarely; showtimes are the most volatile.
+CACHE_TTLS = {
+    "now_playing": int(os.getenv("CACHE_TTL_NOW_PLAYING", 6 * 60 * 60)),
+    "reviews": int(os.getenv("CACHE_TTL_REVIEWS", 24 * 60 * 60)),
+    "showtimes": int(os.getenv("CACHE_TTL_SHOWTIMES", 60 * 60)),
+}
+
+# "compact" trims tool output to what the model needs; "verbose" keeps the
+# full markdown dump of every overview and review.
+TOOL_OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "compact")
+OVERVIEW_MAX_CHARS = int(os.getenv("OVERVIEW_MAX_CHARS", "160"))
+REVIEW_TOP_N = int(os.getenv("REVIEW_TOP_N", "3"))
+REVIEW_MAX_TOKENS = int(os.getenv("REVIEW_MAX_TOKENS", "120"))
+# Compact get_showtimes output covers this many days and theaters; the rest
+# stays in the showtime store for find_showtimes.
+SHOWTIMES_MAX_DAYS = int(os.getenv("SHOWTIMES_MAX_DAYS", "1"))
+SHOWTIMES_MAX_THEATERS = int(os.getenv("SHOWTIMES_MAX_THEATERS", "5"))
+
+# Now playing pages fetched to build the title to ID index used by get_reviews.
+MOVIE_INDEX_PAGES = int(os.getenv("MOVIE_INDEX_PAGES", "3"))
+
+# Optional background warming of the reviews and showtimes a session is
+# likely to ask for next. Showtimes searches cost SerpAPI quota, so they get
+# their own, smaller top-N.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_REVIEWS_TOP_N = int(os.getenv("PREFETCH_REVIEWS_TOP_N", "5"))
+PREFETCH_SHOWTIMES_TOP_N = int(os.getenv("PREFETCH_SHOWTIMES_TOP_N", "3"))
+
+movie_index = MovieIndex()
+# Every day, theater and time from each showtimes search, so follow-up
+# questions can be answered without another paid search.
+showtime_store = ShowtimeStore(os.getenv("SHOWTIME_DB_PATH", ":memory:"), max_age=CACHE_TTLS["showtimes"])
+prefetcher = Prefetcher(
+    workers=int(os.getenv("PREFETCH_WORKERS", "4")),
+    rate_per_minute=float(os.getenv("PREFETCH_RATE_PER_MINUTE", "30")),
+)
+_background_tasks = set()
+
+response_cache = TTLCache(
+    maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "512")),
+    backend=SQLiteBackend(os.getenv("CACHE_DB_PATH")) if os.getenv("CACHE_DB_PATH") else None,
+    keep_stale=int(os.getenv("CACHE_KEEP_STALE_SECONDS", 24 * 60 * 60)),
+)
+
+upstream_flight = SingleFlight()
+
+# Optional reuse of whole answers for repeated questions. Each answer is
+# checked against the response_cache entries it was built from.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+def _dependency_terms(cache_key):
+    """What a question must mention to be answered from this entry in any
+    session: the movie for reviews, the movie and location for showtimes."""
+    endpoint, _, key = cache_key.partition(":")
+    if endpoint == "now_playing":
+        return []
+    if endpoint == "showtimes":
+        return key.split("|")
+    if endpoint == "reviews" and key.isdigit() and (title := movie_index.title(int(key))):
+        return [title]
+    return None
 
-def get_now_playing_movies():
-    url = "https://api.themoviedb.org/3/movie/now_playing?language=en-US&page=1"
+
+answer_cache = AnswerCache(
+    response_cache.expires_at,
+    maxsize=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "300")),
+    similarity=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9")),
+    dependency_terms=_dependency_terms,
+)
+
+# Per-upstream limits; each setting can be overridden with e.g. TMDB_TIMEOUT
+# or SERPAPI_RATE_PER_SECOND. SerpAPI is billed per search, so it is never
+# hedged by default.
+UPSTREAM_POLICIES = {
+    "tmdb": UpstreamPolicy.from_env(
+        "tmdb", rate_per_second=20.0, max_concurrency=20, timeout=5.0, deadline=12.0, retries=2, hedge_after=1.0,
+        failure_threshold=5, reset_timeout=30.0,
+    ),
+    "serpapi": UpstreamPolicy.from_env(
+        "serpapi", rate_per_second=5.0, max_concurrency=8, timeout=15.0, deadline=25.0, retries=1, hedge_after=0.0,
+        failure_threshold=5, reset_timeout=30.0,
+    ),
+}
+ENDPOINT_UPSTREAMS = {"now_playing": "tmdb", "reviews": "tmdb", "showtimes": "serpapi"}
+
+
+def get_http_client():
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=TMDB_BASE_URL,
+            headers={"accept": "application/json"},
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        )
+    return _http_client
+
+
+def set_http_client(client):
+    # Lets benchmarks and other embedders point TMDb calls at their own client.
+    global _http_client
+    _http_client = client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def _tmdb_get(path, params=None):
     headers = {
         "Authorization": f"Bearer {os.getenv('TMDB_API_ACCESS_TOKEN')}"
     }
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        return f"Error fetching data: {response.status_code} - {response.reason}"
-    
-    data = response.json()
+    return await get_http_client().get(path, params=params, headers=headers)
 
-    movies = data.get('results', [])
-    if not movies:
-        return "No movies are currently playing."
 
-    formatted_movies = "The TMDb API returned these movies:\n\n"
+def _serp_search(params):
+    # Imported on first search; most turns never reach SerpAPI.
+    import requests
+    from serpapi import GoogleSearch
+    search = GoogleSearch(params)
+    # wait_for cannot stop this thread, so the socket has to give up by itself
+    # or a SerpAPI brownout fills the executor. The client defaults to 60000s.
+    search.timeout = UPSTREAM_POLICIES["serpapi"].timeout
+    try:
+        return search.get_dict()
+    except requests.RequestException as e:
+        raise RetryableError(f"Error fetching showtimes: {e}") from e
 
-    for movie in movies:
-        title = movie.get('title', 'N/A')
-        movie_id = movie.get('id', 'N/A')
-        release_date = movie.get('release_date', 'N/A')
-        overview = movie.get('overview', 'N/A')
-        formatted_movies += (
-            f"**Title:** {title}\n"
-            f"**Movie ID:** {movie_id}\n"
-            f"**Release Date:** {release_date}\n"
-            f"**Overview:** {overview}\n\n"
-        )
 
-    print(f"formatted_movies: {formatted_movies}")
-    return formatted_movies
+def set_serp_search(search):
+    global _serp_search
+    _serp_search = search
+
+
+def normalize_key(*args):
+    return "|".join(" ".join(str(arg).split()).casefold() for arg in args)
+
+
+def _cache_key(endpoint, key):
+    return f"{endpoint}:{key}"
+
+
+async def _cached(endpoint, key, fetch):
+    cache_key = _cache_key(endpoint, key)
+    value = await response_cache.aget(cache_key)
+    if value is not MISSING:
+        record_dependency(cache_key, response_cache.expires_at(cache_key))
+        return value
+
+    async def fetch_and_store():
+        try:
+            value = await UPSTREAM_POLICIES[ENDPOINT_UPSTREAMS[endpoint]].call(fetch)
+        except UpstreamError as e:
+            # An expired answer beats none while the upstream is failing.
+            stale = await response_cache.aget_stale(cache_key)
+            if stale is MISSING:
+                raise
+            logger.warning("Serving stale %s: %s", cache_key, e)
+            return stale
+        await response_cache.aset(cache_key, value, CACHE_TTLS[endpoint])
+        return value
+
+    value = await upstream_flight.do(cache_key, fetch_and_store)
+    # A stale fallback has no fresh entry, so nothing built on it is reused.
+    record_dependency(cache_key, response_cache.expires_at(cache_key))
+    return value
 
-def get_showtimes(title, location):
-    print(f"Searching for showtimes for {title} in {location}")
+
+def spawn(coro):
+    # Background work outlives the turn that started it, so it must not
+    # inherit that turn's dependency tracking or metrics.
+    task = asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _check_response(response, action):
+    if response.status_code == 200:
+        return response.json()
+    message = f"Error fetching {action}: {response.status_code} - {response.reason_phrase}"
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableError(message)
+    raise UpstreamError(message)
+
+
+async def _fetch_now_playing(page=1):
+    response = await _tmdb_get("/movie/now_playing", {"language": "en-US", "page": page})
+    return _check_response(response, "data")
+
+
+async def _fetch_reviews(movie_id):
+    response = await _tmdb_get(f"/movie/{movie_id}/reviews", {"language": "en-US", "page": 1})
+    return _check_response(response, "reviews")
+
+
+async def _fetch_showtimes(title, location):
     params = {
         "api_key": os.getenv('SERP_API_KEY'),
         "engine": "google",
@@ -51,66 +248,275 @@ def get_showtimes(title, location):
         "gl": "us",
         "hl": "en"
     }
+    results = await run_blocking(_serp_search, params)
+    logger.debug("SerpAPI returned %d days of showtimes for %s in %s", len(results.get("showtimes", [])), title, location)
+    if "error" in results and "showtimes" not in results:
+        # SerpAPI reports "no results" as an error too; only quota and
+        # server trouble are worth retrying.
+        error = results["error"]
+        if "hasn't returned any results" in error:
+            return {"showtimes": []}
+        raise RetryableError(f"Error fetching showtimes: {error}")
+    # Only the showtimes block is used, so that is all we keep around.
+    showtimes = results.get("showtimes", [])
+    showtime_store.replace(title, location, showtimes)
+    return {"showtimes": showtimes}
 
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    print(results)
 
-    if 'showtimes' not in results:
-        return f"No showtimes found for {title} in {location}."
+def _clip(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
 
-    showtimes = results['showtimes'][0]
-    formatted_showtimes = f"Showtimes for {title} in {location}:\n\n"
 
-    if showtimes['theaters']:
-        theater = showtimes['theaters'][0]
-        theater_name = theater.get('name', 'Unknown Theater')
-        formatted_showtimes += f"**{theater_name}**\n"
+def _format_now_playing(movies, compact):
+    if compact:
+        lines = ["Now playing (ID | Title | Release Date | Overview):"]
+        lines.extend(
+            f"{movie.get('id', 'N/A')} | {movie.get('title', 'N/A')} | {movie.get('release_date', 'N/A')} | "
+            f"{_clip(movie.get('overview', 'N/A'), OVERVIEW_MAX_CHARS)}"
+            for movie in movies
+        )
+        return "\n".join(lines) + "\n"
 
-        date = showtimes.get('day', 'Unknown Date')
-        formatted_showtimes += f"  {date}:\n"
+    parts = ["The TMDb API returned these movies:\n\n"]
+    for movie in movies:
+        parts.append(
+            f"**Title:** {movie.get('title', 'N/A')}\n"
+            f"**Movie ID:** {movie.get('id', 'N/A')}\n"
+            f"**Release Date:** {movie.get('release_date', 'N/A')}\n"
+            f"**Overview:** {movie.get('overview', 'N/A')}\n\n"
+        )
+    return "".join(parts)
 
-        for showing in theater.get('showing', []):
-            for time in showing.get('time', []):
-                formatted_showtimes += f"    - {time}\n"
 
-    formatted_showtimes += "\n"
+def _format_showtimes(title, location, showtimes, compact):
+    if compact:
+        lines = [f"Showtimes for {title} in {location} (Day | Theater: times):"]
+        more = []
+        for day in showtimes[:SHOWTIMES_MAX_DAYS]:
+            theaters = day.get('theaters', [])
+            for theater in theaters[:SHOWTIMES_MAX_THEATERS]:
+                times = ", ".join(
+                    showtime for showing in theater.get('showing', []) for showtime in showing.get('time', [])
+                )
+                lines.append(f"{day.get('day', 'Unknown Date')} | {theater.get('name', 'Unknown Theater')}: {times}")
+            if len(theaters) > SHOWTIMES_MAX_THEATERS:
+                more.append(f"{len(theaters) - SHOWTIMES_MAX_THEATERS} more theaters {day.get('day', 'Unknown Date')}")
+        more.extend(day.get('day', 'Unknown Date') for day in showtimes[SHOWTIMES_MAX_DAYS:])
+        if more:
+            lines.append(f"Not shown: {', '.join(more)}. Use find_showtimes for those.")
+        return "\n".join(lines) + "\n"
 
-    return formatted_showtimes
+    parts = [f"Showtimes for {title} in {location}:\n\n"]
+    for day in showtimes:
+        for theater in day.get('theaters', []):
+            parts.append(f"**{theater.get('name', 'Unknown Theater')}**\n")
+            parts.append(f"  {day.get('day', 'Unknown Date')}:\n")
+            for showing in theater.get('showing', []):
+                for showtime in showing.get('time', []):
+                    parts.append(f"    - {showtime}\n")
+    parts.append("\n")
+    return "".join(parts)
 
-def buy_ticket(theater, movie, showtime):
-    return f"Ask the user to confirm their ticket purchase for {movie} at {theater} at {showtime}."
 
-def confirm_ticket_purchase(theater, movie, showtime):
-    return f"Ticket purchase confirmed for {movie} at {theater} for {showtime}."
+def _review_rating(review):
+    rating = (review.get('author_details') or {}).get('rating')
+    return rating if isinstance(rating, (int, float)) else -1
 
-def get_reviews(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/reviews?language=en-US&page=1"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {os.getenv('TMDB_API_ACCESS_TOKEN')}"
-    }
-    response = requests.get(url, headers=headers)
-    reviews_data = response.json()
 
-    if 'results' not in reviews_data or not reviews_data['results']:
-        return "No reviews found."
+def _format_reviews(reviews, compact):
+    if compact:
+        top_reviews = sorted(reviews, key=_review_rating, reverse=True)[:REVIEW_TOP_N]
+        lines = [f"Top {len(top_reviews)} of {len(reviews)} reviews:"]
+        for review in top_reviews:
+            rating = (review.get('author_details') or {}).get('rating')
+            rating = f"{rating}/10" if rating is not None else "unrated"
+            content = truncate_to_tokens(" ".join(review.get('content', '').split()), REVIEW_MAX_TOKENS)
+            lines.append(f"- {review.get('author', 'N/A')} ({rating}): {content}")
+        return "\n".join(lines) + "\n"
 
-    formatted_reviews = ""
-    for review in reviews_data['results']:
-        author = review.get('author', 'N/A')
-        rating = review.get('author_details', {}).get('rating', 'N/A')
-        content = review.get('content', 'N/A')
-        created_at = review.get('created_at', 'N/A')
-        url = review.get('url', 'N/A')
-
-        formatted_reviews += (
-            f"**Author:** {author}\n"
-            f"**Rating:** {rating}\n"
-            f"**Content:** {content}\n"
-            f"**Created At:** {created_at}\n"
-            f"**URL:** {url}\n"
+    parts = []
+    for review in reviews:
+        parts.append(
+            f"**Author:** {review.get('author', 'N/A')}\n"
+            f"**Rating:** {review.get('author_details', {}).get('rating', 'N/A')}\n"
+            f"**Content:** {review.get('content', 'N/A')}\n"
+            f"**Created At:** {review.get('created_at', 'N/A')}\n"
+            f"**URL:** {review.get('url', 'N/A')}\n"
             "----------------------------------------\n"
         )
+    return "".join(parts)
+
+
+async def _now_playing_page(page):
+    data = await _cached("now_playing", f"en-US:{page}", lambda: _fetch_now_playing(page))
+    movie_index.add_movies(data.get('results', []))
+    return data
+
+
+async def _load_reviews(movie_id):
+    return await _cached("reviews", normalize_key(movie_id), lambda: _fetch_reviews(movie_id))
+
+
+async def _load_showtimes(title, location):
+    results = await _cached("showtimes", normalize_key(title, location), lambda: _fetch_showtimes(title, location))
+    # Answers served from the persistent or stale cache never went through
+    # _fetch_showtimes, so make sure the store has them too.
+    if results['showtimes'] and not showtime_store.query(title, location, limit=1):
+        showtime_store.replace(title, location, results['showtimes'])
+    return results
+
+
+def _prefetch(endpoint, key, load):
+    cache_key = _cache_key(endpoint, key)
+    if response_cache.peek(cache_key) is MISSING:
+        prefetcher.schedule(cache_key, load)
+
+
+def prefetch_reviews(movies):
+    for movie in movies[:PREFETCH_REVIEWS_TOP_N]:
+        movie_id = movie.get('id')
+        _prefetch("reviews", normalize_key(movie_id), lambda movie_id=movie_id: _load_reviews(movie_id))
+
+
+def prefetch_showtimes(location):
+    now_playing = response_cache.peek(_cache_key("now_playing", "en-US:1"))
+    if now_playing is MISSING:
+        return
+    for movie in now_playing.get('results', [])[:PREFETCH_SHOWTIMES_TOP_N]:
+        title = movie.get('title')
+        _prefetch("showtimes", normalize_key(title, location), lambda title=title: _load_showtimes(title, location))
+
+
+async def refresh_movie_index(pages=None):
+    pages = MOVIE_INDEX_PAGES if pages is None else pages
+    first = await _now_playing_page(1)
+    last_page = min(pages, first.get('total_pages', 1))
+    await asyncio.gather(*(_now_playing_page(page) for page in range(2, last_page + 1)), return_exceptions=True)
+    return len(movie_index)
+
+
+async def resolve_movie(movie_id=None, movie_title=None):
+    """Return the (movie_id, title) to use. A given ID is only replaced when
+    the title exactly names another indexed movie; fuzzy matching is for
+    titles that come without an ID."""
+    if movie_title:
+        exact = movie_id is not None
+        match = movie_index.resolve(movie_title, exact=exact)
+        if match is None and movie_id not in movie_index:
+            try:
+                await refresh_movie_index()
+            except UpstreamError as e:
+                logger.warning("Could not refresh movie index: %s", e)
+            match = movie_index.resolve(movie_title, exact=exact)
+        if match is not None:
+            return match
+    return movie_id, movie_title or movie_index.title(movie_id)
+
+
+def cache_stats():
+    return {
+        **response_cache.stats(), **upstream_flight.stats(),
+        "prefetch": prefetcher.stats(), "answers": answer_cache.stats(),
+    }
+
+
+def upstream_stats():
+    return {
+        name: {**policy.stats, "circuit": policy.breaker.state}
+        for name, policy in UPSTREAM_POLICIES.items()
+    }
+
+
+metrics.register_stats("response_cache", response_cache.stats)
+metrics.register_stats("answer_cache", answer_cache.stats)
+metrics.register_stats("upstream_flight", upstream_flight.stats)
+metrics.register_stats("prefetch", prefetcher.stats)
+for _name, _policy in UPSTREAM_POLICIES.items():
+    metrics.register_stats(f"upstream_{_name}", lambda policy=_policy: policy.stats)
+
+
+async def get_now_playing_movies():
+    try:
+        data = await _now_playing_page(1)
+    except UpstreamError as e:
+        # Nothing built on an error message should be cached.
+        mark_uncacheable()
+        return str(e)
+    if MOVIE_INDEX_PAGES > 1:
+        spawn(refresh_movie_index())
+    if PREFETCH_ENABLED:
+        prefetch_reviews(data.get('results', []))
+
+    movies = data.get('results', [])
+    if not movies:
+        return "No movies are currently playing."
+
+    formatted_movies = _format_now_playing(movies, TOOL_OUTPUT_MODE == "compact")
+    logger.debug("formatted_movies: %s", formatted_movies)
+    return formatted_movies
+
+async def get_showtimes(title, location):
+    logger.debug("Searching for showtimes for %s in %s", title, location)
+    try:
+        results = await _load_showtimes(title, location)
+    except UpstreamError as e:
+        mark_uncacheable()
+        return str(e)
+    if PREFETCH_ENABLED:
+        prefetch_showtimes(location)
+
+    if not results['showtimes']:
+        return f"No showtimes found for {title} in {location}."
+
+    return _format_showtimes(title, location, results['showtimes'], TOOL_OUTPUT_MODE == "compact")
+
+async def find_showtimes(title=None, location=None, theater=None, day=None, after=None):
+    rows = showtime_store.query(title, location, theater, day, after)
+    if not rows:
+        return "No matching showtimes have been retrieved yet. Use get_showtimes to search."
+
+    lines = ["Stored showtimes (Title | Location | Day | Theater | Time):"]
+    lines.extend(
+        f"{row['title']} | {row['location']} | {row['day']} | {row['theater']} | {row['time']}" for row in rows
+    )
+    return "\n".join(lines) + "\n"
+
+def buy_ticket(theater, movie, showtime, quantity=1):
+    try:
+        hold = reservations.hold(theater, movie, showtime, current_holder.get(), quantity or 1)
+    except SoldOutError as e:
+        return f"Tickets for {movie} at {theater} at {showtime} are not available. {e}"
+    except ReservationError as e:
+        return f"Could not hold tickets for {movie} at {theater} at {showtime}: {e}"
+    minutes = max(1, round(reservations.hold_seconds / 60))
+    return (
+        f"Holding seat(s) {', '.join(hold.seats)} for {minutes} minutes. "
+        f"Ask the user to confirm their ticket purchase for {movie} at {theater} at {showtime}."
+    )
+
+def confirm_ticket_purchase(theater, movie, showtime):
+    try:
+        seats = reservations.confirm(theater, movie, showtime, current_holder.get())
+    except HoldExpiredError:
+        return f"The seat hold for {movie} at {theater} at {showtime} expired. Ask the user if they want to buy again."
+    except NoHoldError:
+        return f"There are no held seats for {movie} at {theater} at {showtime}. Call buy_ticket first."
+    return f"Ticket purchase confirmed for {movie} at {theater} for {showtime}. Seat(s): {', '.join(seats)}."
+
+async def get_reviews(movie_id=None, movie_title=None):
+    movie_id, _ = await resolve_movie(movie_id, movie_title)
+    if movie_id is None:
+        return "No reviews found."
+
+    try:
+        reviews_data = await _load_reviews(movie_id)
+    except UpstreamError as e:
+        mark_uncacheable()
+        return str(e)
+
+    if 'results' not in reviews_data or not reviews_data['results']:
+        return "No reviews found."
 
-    return formatted_reviews
\ No newline at end of file
+    formatted_reviews = _format_reviews(reviews_data['results'], TOOL_OUTPUT_MODE == "compact")
+    return formatted_reviews
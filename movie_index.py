@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_title(title):
+    title = unicodedata.normalize("NFKD", str(title)).encode("ascii", "ignore").decode()
+    title = NON_WORD.sub(" ", title.casefold().replace("&", " and "))
+    words = title.split()
+    if words and words[0] in ("the", "a", "an") and len(words) > 1:
+        words = words[1:]
+    return " ".join(words)
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MovieIndex:
+    """Title to TMDb ID lookup with exact, token and trigram matching."""
+
+    def __init__(self, min_score=0.45):
+        self.min_score = min_score
+        self._titles = {}
+        self._exact = {}
+        self._grams = {}
+        self._words = {}
+        self._postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __contains__(self, movie_id):
+        return movie_id in self._titles
+
+    def title(self, movie_id):
+        return self._titles.get(movie_id)
+
+    def add(self, movie_id, title):
+        if movie_id is None or not title:
+            return
+        normalized = normalize_title(title)
+        self._titles[movie_id] = title
+        self._exact[normalized] = movie_id
+        grams = trigrams(normalized)
+        self._grams[movie_id] = grams
+        self._words[movie_id] = frozenset(normalized.split())
+        for gram in grams:
+            self._postings[gram].add(movie_id)
+
+    def add_movies(self, movies):
+        for movie in movies:
+            self.add(movie.get("id"), movie.get("title"))
+
+    def resolve(self, title, exact=False):
+        """Return (movie_id, title) for the best match, or None. With exact,
+        only a title that normalizes to the same text matches."""
+        if not title:
+            return None
+        normalized = normalize_title(title)
+        movie_id = self._exact.get(normalized)
+        if movie_id is not None:
+            return movie_id, self._titles[movie_id]
+        if exact:
+            return None
+
+        query = trigrams(normalized)
+        shared = Counter()
+        for gram in query:
+            for candidate in self._postings.get(gram, ()):
+                shared[candidate] += 1
+        if not shared:
+            return None
+
+        query_words = set(normalized.split())
+        best_id, best_score = None, 0.0
+        for candidate, overlap in shared.items():
+            score = overlap / (len(query) + len(self._grams[candidate]) - overlap)
+            # A partial title like "crouching tiger" should find the full one.
+            if query_words and query_words <= self._words[candidate]:
+                score = max(score, 0.9)
+            if score > best_score:
+                best_id, best_score = candidate, score
+        if best_score < self.min_score:
+            return None
+        return best_id, self._titles[best_id]
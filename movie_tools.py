@@ -0,0 +1,129 @@
+from movie_functions import (
+    get_now_playing_movies, get_showtimes, find_showtimes, buy_ticket, confirm_ticket_purchase, get_reviews,
+)
+from tool_registry import Tool, ToolRegistry
+import metrics
+
+registry = ToolRegistry()
+
+THEATER_ARGUMENT = {
+    "type": "string",
+    "description": "The name of the theater, for example 'AMC Metreon 16'",
+}
+MOVIE_ARGUMENT = {
+    "type": "string",
+    "description": "The title of the movie, for example 'Avengers: Endgame'",
+}
+SHOWTIME_ARGUMENT = {
+    "type": "string",
+    "description": "The showtime for the movie, for example '7pm'",
+}
+
+registry.register(Tool(
+    name="get_now_playing_movies",
+    handler=get_now_playing_movies,
+    description="Get the movies that are playing now in theaters. Call this whenever the user wants to what are the movies showing in theaters, for example when a customer asks 'What are the movies playing now?'",
+    cache_ttl=60,
+    timeout=15,
+    eager=True,
+))
+
+registry.register(Tool(
+    name="get_showtimes",
+    handler=get_showtimes,
+    description="Get the showtimes for a movie. Call this whenever the user wants to know the showtimes for a movie, for example when a customer asks 'What are the showtimes for Avengers: Endgame? near San Francisco'",
+    parameters={
+        "type": "object",
+        "properties": {
+            "title": {
+                "type": "string",
+                "description": "The title of the movie.",
+            },
+            "location": {
+                "type": "string",
+                "description": "The location of the theater, for example 'San Francisco'.",
+            },
+        },
+        "required": ["title", "location"],
+    },
+    cache_ttl=60,
+    timeout=30,
+    eager=True,
+))
+
+registry.register(Tool(
+    name="find_showtimes",
+    handler=find_showtimes,
+    description="Search the showtimes already retrieved by get_showtimes, across every theater and day. Call this first for follow-up questions such as 'Is there a later showing at another theater?', and only call get_showtimes when it finds nothing.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "title": {"type": "string", "description": "Part of the movie title."},
+            "location": {"type": "string", "description": "The location that was searched, for example 'San Francisco'."},
+            "theater": {"type": "string", "description": "Part of the theater name."},
+            "day": {"type": "string", "description": "The day as listed, for example 'Today' or 'Tomorrow'."},
+            "after": {"type": "string", "description": "Only showings after this time, for example '7pm'."},
+        },
+        "required": [],
+    },
+    timeout=5,
+    eager=True,
+))
+
+registry.register(Tool(
+    name="buy_ticket",
+    handler=buy_ticket,
+    description="Buy a ticket for a movie. Call this whenever the user wants to buy a ticket for a movie, for example when a customer asks 'I want to buy a ticket for Avengers: Endgame at 7pm. Is that available?'. This holds the seats until the purchase is confirmed.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "theater": THEATER_ARGUMENT,
+            "movie": MOVIE_ARGUMENT,
+            "showtime": SHOWTIME_ARGUMENT,
+            "quantity": {"type": "integer", "description": "Number of tickets, 1 if not stated."},
+        },
+        "required": ["theater", "movie", "showtime"],
+    },
+    timeout=5,
+))
+
+registry.register(Tool(
+    name="confirm_ticket_purchase",
+    handler=confirm_ticket_purchase,
+    description="Confirm a ticket purchase. Call this whenever the user wants to confirm a ticket purchase",
+    parameters={
+        "type": "object",
+        "properties": {"theater": THEATER_ARGUMENT, "movie": MOVIE_ARGUMENT, "showtime": SHOWTIME_ARGUMENT},
+        "required": ["theater", "movie", "showtime"],
+    },
+    timeout=5,
+))
+
+registry.register(Tool(
+    name="get_reviews",
+    handler=get_reviews,
+    description="Evaluate the conversation, and determine if the user is asking for reviews for a movie. If so, provide the title of the movie, and its ID if known. If not, return null.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "movie_id": {
+                "type": "integer",
+                "description": "ID of the movie to fetch reviews for"
+            },
+            "movie_title": {
+                "type": "string",
+                "description": "Title of the movie to fetch reviews for"
+            }
+        },
+        "required": [],
+    },
+    cache_ttl=60,
+    timeout=15,
+    eager=True,
+    required_any=("movie_id", "movie_title"),
+))
+
+CHAT_TOOLS = ["get_now_playing_movies", "get_showtimes", "find_showtimes", "buy_ticket", "confirm_ticket_purchase"]
+REVIEW_TOOLS = ["get_reviews"]
+
+metrics.register_stats("tool_cache", registry.cache.stats)
@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import logging
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Runs best-effort background fetches on a bounded worker pool.
+
+    Jobs are dropped rather than queued without limit, duplicates of a job
+    that is already pending are ignored, and every job waits for the rate
+    budget. Warming still goes through the same upstream limits as user
+    requests, so the budget caps how much of that quota it can take.
+    """
+
+    def __init__(self, workers=4, rate_per_minute=30, queue_size=100):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.budget = TokenBucket(rate_per_minute / 60, capacity=max(workers, 1))
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._pending = set()
+        self._queue = None
+        self._tasks = []
+
+    def schedule(self, key, fetch):
+        if key in self._pending:
+            return False
+        if self._queue is None:
+            self._start()
+        try:
+            self._queue.put_nowait((key, fetch))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add(key)
+        self.scheduled += 1
+        return True
+
+    def stats(self):
+        return {
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": len(self._pending),
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._pending.clear()
+
+    def _start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Workers start inside some turn's tool call; a fresh context keeps them
+        # from recording into that turn's dependencies, metrics and holder.
+        self._tasks = [
+            asyncio.get_running_loop().create_task(self._worker(), context=contextvars.Context())
+            for _ in range(self.workers)
+        ]
+
+    async def _worker(self):
+        while True:
+            key, fetch = await self._queue.get()
+            try:
+                await self.budget.acquire()
+                await fetch()
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.info("Prefetch of %s failed: %s", key, e)
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
@@ -0,0 +1,204 @@
+import bisect
+import contextlib
+import contextvars
+import heapq
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from movie_index import normalize_title
+from showtime_store import parse_time
+
+SEAT_ROWS = int(os.getenv("THEATER_ROWS", "10"))
+SEATS_PER_ROW = int(os.getenv("THEATER_SEATS_PER_ROW", "12"))
+HOLD_SECONDS = float(os.getenv("TICKET_HOLD_SECONDS", "300"))
+RESERVATION_SHARDS = int(os.getenv("RESERVATION_SHARDS", "64"))
+# How often a shard drops showings with no holds and no sales.
+SWEEP_SECONDS = 60
+
+# Who is buying; the app sets this to the Chainlit session ID for each message.
+current_holder = contextvars.ContextVar("current_holder", default="anonymous")
+
+
+class ReservationError(Exception):
+    pass
+
+
+class SoldOutError(ReservationError):
+    pass
+
+
+class NoHoldError(ReservationError):
+    pass
+
+
+class HoldExpiredError(ReservationError):
+    pass
+
+
+def _key(value):
+    return " ".join(re.sub(r"[^\w\s:]", " ", str(value).casefold()).split())
+
+
+def _seat_name(index):
+    return f"{chr(ord('A') + index // SEATS_PER_ROW)}{index % SEATS_PER_ROW + 1}"
+
+
+@dataclass
+class Hold:
+    id: str
+    holder: str
+    seats: list
+    expires_at: float
+
+
+@dataclass
+class Showing:
+    capacity: int
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    available: list = field(default_factory=list)
+    sold: dict = field(default_factory=dict)
+    holds: dict = field(default_factory=dict)
+    expiry_heap: list = field(default_factory=list)
+    # Set once the showing is dropped from its shard; callers look it up again.
+    retired: bool = False
+
+    def __post_init__(self):
+        self.available = list(range(self.capacity))
+
+    def expire(self, now):
+        # Called with the lock held; frees seats of holds that ran out.
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            _, holder, hold_id = heapq.heappop(self.expiry_heap)
+            hold = self.holds.get(holder)
+            if hold is not None and hold.id == hold_id:
+                self._release(holder)
+
+    def _release(self, holder):
+        hold = self.holds.pop(holder)
+        for seat in hold.seats:
+            bisect.insort(self.available, seat)
+        return hold
+
+
+class ReservationEngine:
+    """Per-showing seat maps with time-limited holds.
+
+    Each showing has its own lock, and showings are found through sharded
+    registries, so sessions racing for different showings never contend and
+    sessions racing for the same one serialize only on that showing.
+
+    Only buy_ticket creates a showing. Showings left with no holds and no
+    sales are dropped by a periodic sweep of their shard, so showtimes the
+    model made up do not stay in memory.
+    """
+
+    def __init__(self, capacity=None, hold_seconds=None, shards=None):
+        self.capacity = capacity or SEAT_ROWS * SEATS_PER_ROW
+        self.hold_seconds = HOLD_SECONDS if hold_seconds is None else hold_seconds
+        self._shards = [({}, threading.Lock()) for _ in range(shards or RESERVATION_SHARDS)]
+        self._swept = [time.monotonic()] * len(self._shards)
+
+    def _showing(self, key, create):
+        index = hash(key) % len(self._shards)
+        showings, lock = self._shards[index]
+        showing = showings.get(key)
+        if showing is None and create:
+            with lock:
+                showing = showings.get(key)
+                if showing is None:
+                    self._sweep(index)
+                    showing = showings[key] = Showing(self.capacity)
+        return showing
+
+    @contextlib.contextmanager
+    def _locked(self, theater, movie, showtime, create=False):
+        """The showing with its lock held, or None if it does not exist."""
+        # "7:30pm" and "19:30", or "Dune: Part Two" and "Dune Part Two", are the
+        # same showing however the model spells them.
+        minutes = parse_time(showtime)
+        key = (_key(theater), normalize_title(movie), _key(showtime) if minutes is None else minutes)
+        while True:
+            showing = self._showing(key, create)
+            if showing is None:
+                yield None
+                return
+            with showing.lock:
+                if not showing.retired:
+                    yield showing
+                    return
+
+    def _sweep(self, index):
+        # Called with the shard lock held. Busy showings are skipped rather
+        # than waited for; they are not empty anyway.
+        now = time.monotonic()
+        if now - self._swept[index] < SWEEP_SECONDS:
+            return
+        self._swept[index] = now
+        showings, _ = self._shards[index]
+        for key, showing in list(showings.items()):
+            if not showing.lock.acquire(blocking=False):
+                continue
+            try:
+                showing.expire(now)
+                if not showing.holds and not showing.sold:
+                    showing.retired = True
+                    del showings[key]
+            finally:
+                showing.lock.release()
+
+    def hold(self, theater, movie, showtime, holder, quantity=1):
+        if quantity < 1:
+            raise ReservationError("At least one ticket is needed.")
+        now = time.monotonic()
+        with self._locked(theater, movie, showtime, create=True) as showing:
+            showing.expire(now)
+            # Asking again replaces the holder's previous hold instead of stacking.
+            if holder in showing.holds:
+                showing._release(holder)
+            if len(showing.available) < quantity:
+                raise SoldOutError(f"Only {len(showing.available)} seats are left.")
+            seats = showing.available[:quantity]
+            del showing.available[:quantity]
+            hold = Hold(uuid.uuid4().hex, holder, seats, now + self.hold_seconds)
+            showing.holds[holder] = hold
+            heapq.heappush(showing.expiry_heap, (hold.expires_at, holder, hold.id))
+        return Hold(hold.id, holder, [_seat_name(seat) for seat in seats], hold.expires_at)
+
+    def confirm(self, theater, movie, showtime, holder):
+        now = time.monotonic()
+        with self._locked(theater, movie, showtime) as showing:
+            if showing is None:
+                raise NoHoldError("There is no seat hold to confirm.")
+            hold = showing.holds.get(holder)
+            if hold is not None and hold.expires_at <= now:
+                showing.expire(now)
+                raise HoldExpiredError("The seat hold expired before it was confirmed.")
+            showing.expire(now)
+            if hold is None:
+                raise NoHoldError("There is no seat hold to confirm.")
+            del showing.holds[holder]
+            for seat in hold.seats:
+                showing.sold[seat] = holder
+        return [_seat_name(seat) for seat in hold.seats]
+
+    def release(self, theater, movie, showtime, holder):
+        with self._locked(theater, movie, showtime) as showing:
+            if showing is not None and holder in showing.holds:
+                showing._release(holder)
+                return True
+        return False
+
+    def availability(self, theater, movie, showtime):
+        with self._locked(theater, movie, showtime) as showing:
+            if showing is None:
+                return {"available": self.capacity, "held": 0, "sold": 0}
+            showing.expire(time.monotonic())
+            held = sum(len(hold.seats) for hold in showing.holds.values())
+            return {"available": len(showing.available), "held": held, "sold": len(showing.sold)}
+
+
+reservations = ReservationEngine()
@@ -0,0 +1,87 @@
+import re
+
+import metrics
+
+# Cheap local rules run before the review classifier. They only skip it when
+# reviews are already in context, or when the message is purely transactional
+# or a bare acknowledgement; everything else still goes to the LLM.
+REVIEW_CONTEXT_PATTERN = re.compile(r"^CONTEXT: Reviews for (?P<title>.*?) \(ID: (?P<id>[^)]*)\)")
+REVIEW_INTENT_PATTERN = re.compile(
+    r"\b(reviews?|critics?|critical|ratings?|rated|score|reception|opinions?|recommend\w*|worth|"
+    r"good|great|bad|any good|should (i|we)|go see|or not|thoughts?|think|like|liked|hype|scary|funny)\b",
+    re.IGNORECASE,
+)
+# Words that only ever mean the user wants an opinion on the film. Generic
+# ones like "good" or "like" also turn up in "sounds good, book it".
+REVIEW_TERMS_PATTERN = re.compile(
+    r"\b(reviews?|critics?|critical|ratings?|rated|reception|recommend\w*|worth|any good|or not)\b",
+    re.IGNORECASE,
+)
+# Only messages that are purely about buying tickets or finding showtimes, or
+# that are nothing but an acknowledgement, skip the classifier; a bare title
+# or an open question still goes to it.
+TRANSACTIONAL_PATTERN = re.compile(
+    r"\b(buy|purchase|tickets?|confirm\w*|book|seats?|showtimes?)\b", re.IGNORECASE,
+)
+ACKNOWLEDGEMENTS = frozenset({
+    "thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty", "bye", "goodbye",
+    "hello", "hi", "hey", "ok", "okay", "ok thanks", "okay thanks", "cool", "great thanks",
+    "yes", "yep", "yeah", "no", "nope", "sure", "no thanks", "got it", "yes please", "sure thanks",
+    "sounds good", "great", "perfect", "good", "nice", "awesome",
+})
+
+_stats = {"checked": 0, "skipped_irrelevant": 0, "skipped_present": 0, "fired": 0}
+
+
+def _normalize(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", text.casefold()).split())
+
+
+def reviewed_movies(message_history):
+    reviewed = {}
+    for message in message_history:
+        if message.get("role") != "system":
+            continue
+        match = REVIEW_CONTEXT_PATTERN.match(message.get("content") or "")
+        if match:
+            reviewed[match.group("id").strip()] = match.group("title").strip()
+    return reviewed
+
+
+def should_check_reviews(message_history):
+    user_message = next(
+        (m.get("content") or "" for m in reversed(message_history) if m.get("role") == "user"), ""
+    )
+    _stats["checked"] += 1
+
+    # Ticket talk and acknowledgements win over generic intent words, unless
+    # the user also asks something only reviews can answer.
+    transactional = TRANSACTIONAL_PATTERN.search(user_message) or _normalize(user_message) in ACKNOWLEDGEMENTS
+    if transactional and not REVIEW_TERMS_PATTERN.search(user_message):
+        _stats["skipped_irrelevant"] += 1
+        return False
+
+    if REVIEW_INTENT_PATTERN.search(user_message):
+        text = f" {_normalize(user_message)} "
+        for movie_id, title in reviewed_movies(message_history).items():
+            if (title and f" {_normalize(title)} " in text) or f" {movie_id} " in text:
+                _stats["skipped_present"] += 1
+                return False
+        _stats["fired"] += 1
+        return True
+
+    _stats["fired"] += 1
+    return True
+
+
+def review_gate_stats():
+    checked = _stats["checked"]
+    skipped = _stats["skipped_irrelevant"] + _stats["skipped_present"]
+    return {
+        **_stats,
+        "skip_rate": skipped / checked if checked else 0.0,
+        "fire_rate": _stats["fired"] / checked if checked else 0.0,
+    }
+
+
+metrics.register_stats("review_gate", review_gate_stats)
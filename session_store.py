@@ -0,0 +1,402 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import metrics
+
+# "memory" keeps encoded histories in this process, "sqlite" in SESSION_DB_PATH,
+# and "redis" in REDIS_URL, or in an in-process stand-in when that is unset.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL")
+# Histories untouched for this long are dropped from memory and decoded again
+# from the backend on the next message.
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "300"))
+SESSION_HOT_MAX = int(os.getenv("SESSION_HOT_MAX", "1000"))
+# Stored histories are deleted after this long without a write, matching
+# Chainlit's session_timeout.
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+COMPRESS_MIN_BYTES = 256
+
+ROLES = ["system", "user", "assistant", "tool"]
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+def encode_message(message):
+    """A message as bytes: [role code, content] when that is all it has,
+    compact JSON otherwise, and zlib-compressed once it is worth it."""
+    if len(message) == 2 and message.get("role") in ROLE_CODES and "content" in message:
+        payload = [ROLE_CODES[message["role"]], message["content"]]
+    else:
+        payload = message
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def decode_message(data):
+    data = bytes(data)
+    payload = json.loads(zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:])
+    if isinstance(payload, list):
+        return {"role": ROLES[payload[0]], "content": payload[1]}
+    return payload
+
+
+class MemoryBackend:
+    # Nothing here blocks, so SessionStore calls it on the event loop.
+    blocking = False
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            return list(self._sessions.get(session_id, (0, []))[1])
+
+    def length(self, session_id):
+        with self._lock:
+            return len(self._sessions.get(session_id, (0, []))[1])
+
+    def append(self, session_id, blobs, expected):
+        """Add blobs if the history still has `expected` messages; False if not."""
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, [0, []])
+            if len(entry[1]) != expected:
+                return False
+            entry[0] = time.time()
+            entry[1].extend(blobs)
+            return True
+
+    def replace(self, session_id, blobs):
+        with self._lock:
+            self._sessions[session_id] = [time.time(), list(blobs)]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_older_than(self, max_age):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for session_id in [s for s, (updated, _) in self._sessions.items() if updated < cutoff]:
+                del self._sessions[session_id]
+
+
+class SQLiteBackend:
+    blocking = True
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS session_messages (
+                    session_id TEXT, seq INTEGER, data BLOB, PRIMARY KEY (session_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, length INTEGER, updated_at REAL);
+            """)
+
+    def load(self, session_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def length(self, session_id):
+        with self._lock:
+            row = self._conn.execute("SELECT length FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def append(self, session_id, blobs, expected):
+        with self._lock, self._conn:
+            # Take the write lock before reading, so another process sharing
+            # the file cannot append between the check and the insert.
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT length FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            start = row[0] if row else 0
+            if start != expected:
+                return False
+            self._conn.executemany(
+                "INSERT INTO session_messages VALUES (?, ?, ?)",
+                [(session_id, start + i, blob) for i, blob in enumerate(blobs)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, start + len(blobs), time.time())
+            )
+        return True
+
+    def replace(self, session_id, blobs):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT INTO session_messages VALUES (?, ?, ?)",
+                [(session_id, i, blob) for i, blob in enumerate(blobs)],
+            )
+            self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, len(blobs), time.time()))
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_older_than(self, max_age):
+        cutoff = time.time() - max_age
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM session_messages WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                (cutoff,),
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+
+class LocalRedis:
+    """The few list commands RedisBackend needs, in process, for development
+    and benchmarks without a Redis server."""
+
+    def __init__(self):
+        self._lists = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        if key in self._expires and self._expires[key] <= time.time():
+            self._lists.pop(key, None)
+            self._expires.pop(key, None)
+        return self._lists.get(key)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._live(key)
+            if items is None:
+                items = self._lists[key] = []
+            items.extend(values)
+            return len(items)
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._live(key) or [])
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = self._live(key) or []
+            return list(items[start:None if end == -1 else end + 1])
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._lists.pop(key, None)
+                self._expires.pop(key, None)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is not None:
+                self._expires[key] = time.time() + seconds
+
+    def pipeline(self):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self._commands.append((name, args))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self._redis, name)(*args) for name, args in self._commands]
+
+
+class RedisBackend:
+    """One Redis list per session, expiring SESSION_TTL after its last write."""
+
+    blocking = True
+
+    def __init__(self, client, ttl=SESSION_TTL, prefix="session"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, session_id):
+        return f"{self.prefix}:{session_id}:history"
+
+    def load(self, session_id):
+        return self.client.lrange(self._key(session_id), 0, -1)
+
+    def length(self, session_id):
+        return self.client.llen(self._key(session_id))
+
+    def append(self, session_id, blobs, expected):
+        key = self._key(session_id)
+        if self.client.llen(key) != expected:
+            return False
+        length = self.client.pipeline().rpush(key, *blobs).expire(key, self.ttl).execute()[0]
+        # RPUSH returns the new length; anything else means another writer
+        # got in between, and the caller rewrites the whole list.
+        return length == expected + len(blobs)
+
+    def replace(self, session_id, blobs):
+        key = self._key(session_id)
+        pipeline = self.client.pipeline().delete(key)
+        if blobs:
+            pipeline.rpush(key, *blobs).expire(key, self.ttl)
+        pipeline.execute()
+
+    def delete(self, session_id):
+        self.client.delete(self._key(session_id))
+
+    def purge_older_than(self, max_age):
+        # Redis expires the keys itself.
+        pass
+
+
+class SessionStore:
+    """Session message histories behind a pluggable backend.
+
+    Live sessions keep their decoded list in memory, and each load checks it
+    against the backend's length so a history another worker wrote to is
+    reloaded. Saving appends only the messages added since the last save,
+    and only while the backend still holds what this process last saw;
+    otherwise, or when the history was rewritten, the stored
+    history is replaced. Sessions idle for longer than idle_seconds, or
+    beyond max_hot, are dropped from memory.
+
+    The methods are coroutines: SQLite and Redis calls run in a worker
+    thread so they never stall the event loop.
+    """
+
+    def __init__(self, backend, idle_seconds=SESSION_IDLE_SECONDS, max_hot=SESSION_HOT_MAX, ttl=SESSION_TTL):
+        self.backend = backend
+        self.idle_seconds = idle_seconds
+        self.max_hot = max_hot
+        self.ttl = ttl
+        # session_id -> [messages, persisted messages, last used]
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.stats = {
+            "loads": 0, "reloads": 0, "appends": 0, "replaces": 0, "conflicts": 0, "spilled": 0,
+            "appended_messages": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        if SESSION_STORE == "sqlite":
+            return cls(SQLiteBackend(SESSION_DB_PATH))
+        if SESSION_STORE == "redis":
+            if REDIS_URL:
+                import redis
+                return cls(RedisBackend(redis.Redis.from_url(REDIS_URL)))
+            return cls(RedisBackend(LocalRedis()))
+        return cls(MemoryBackend())
+
+    async def _call(self, func, *args):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def load(self, session_id):
+        """The session's history; callers may append to it and save it back."""
+        with self._lock:
+            entry = self._hot.get(session_id)
+        if entry is not None:
+            if await self._call(self.backend.length, session_id) == len(entry[1]):
+                with self._lock:
+                    entry[2] = time.monotonic()
+                    if session_id in self._hot:
+                        self._hot.move_to_end(session_id)
+                return entry[0]
+            # Another worker saved this session since we last did.
+            self.stats["reloads"] += 1
+        blobs = await self._call(self.backend.load, session_id)
+        messages = [decode_message(blob) for blob in blobs]
+        self.stats["loads"] += 1
+        await self._remember(session_id, messages)
+        return messages
+
+    async def save(self, session_id, messages):
+        with self._lock:
+            entry = self._hot.get(session_id)
+            persisted = entry[1] if entry is not None else []
+        # Callers append to the loaded list, so an identical prefix means only
+        # the tail is new.
+        count = len(persisted)
+        if count <= len(messages) and all(a is b for a, b in zip(persisted, messages)):
+            added = messages[count:]
+            if added:
+                if await self._call(self.backend.append, session_id, [encode_message(m) for m in added], count):
+                    self.stats["appends"] += 1
+                    self.stats["appended_messages"] += len(added)
+                else:
+                    # The stored history moved on without us; appending would
+                    # interleave two conversations, so this one replaces it.
+                    self.stats["conflicts"] += 1
+                    await self._replace(session_id, messages)
+        else:
+            await self._replace(session_id, messages)
+        await self._remember(session_id, messages)
+
+    async def reset(self, session_id, messages):
+        """Start a session's history over, whatever the backend held before."""
+        await self._call(self.backend.replace, session_id, [encode_message(m) for m in messages])
+        await self._remember(session_id, messages)
+
+    async def spill(self, session_id):
+        """Drop a session from memory; its history stays in the backend."""
+        with self._lock:
+            if self._hot.pop(session_id, None) is not None:
+                self.stats["spilled"] += 1
+
+    async def delete(self, session_id):
+        with self._lock:
+            self._hot.pop(session_id, None)
+        await self._call(self.backend.delete, session_id)
+
+    def hot_sessions(self):
+        return len(self._hot)
+
+    async def _replace(self, session_id, messages):
+        await self._call(self.backend.replace, session_id, [encode_message(m) for m in messages])
+        self.stats["replaces"] += 1
+
+    async def _remember(self, session_id, messages):
+        with self._lock:
+            self._hot[session_id] = [messages, list(messages), time.monotonic()]
+            self._hot.move_to_end(session_id)
+            purge = self._spill()
+        if purge:
+            await self._call(self.backend.purge_older_than, self.ttl)
+
+    def _spill(self):
+        """Drop sessions beyond max_hot or idle too long. Called with the lock
+        held; True when it is time to purge expired histories as well."""
+        while len(self._hot) > self.max_hot:
+            self._hot.popitem(last=False)
+            self.stats["spilled"] += 1
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.idle_seconds, 60):
+            return False
+        self._last_sweep = now
+        while self._hot:
+            session_id, entry = next(iter(self._hot.items()))
+            if now - entry[2] < self.idle_seconds:
+                break
+            del self._hot[session_id]
+            self.stats["spilled"] += 1
+        return True
+
+
+sessions = SessionStore.from_env()
+metrics.register_stats("sessions", lambda: {**sessions.stats, "hot": sessions.hot_sessions()})
@@ -0,0 +1,103 @@
+import re
+import sqlite3
+import threading
+import time
+
+TIME_PATTERN = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*([ap])\.?\s*m?\.?\s*$", re.IGNORECASE)
+
+
+def parse_time(value):
+    """Minutes after midnight for "7:30pm", "7 PM" or "19:30", else None."""
+    if value is None:
+        return None
+    value = str(value)
+    match = TIME_PATTERN.match(value)
+    if match:
+        hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+        if match.group(3).lower() == "p":
+            hour += 12
+        return hour * 60 + minute
+    match = re.match(r"^\s*(\d{1,2}):(\d{2})\s*$", value)
+    if match:
+        return int(match.group(1)) * 60 + int(match.group(2))
+    return None
+
+
+def _key(value):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(value or "").casefold()).split())
+
+
+class ShowtimeStore:
+    """Every day, theater and time from a showtimes search, queryable locally.
+
+    Rows older than max_age seconds are never returned and are purged on the
+    next replace, so "Today" from yesterday's search is not served.
+    """
+
+    def __init__(self, path=":memory:", max_age=None):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS showtimes (
+                    title TEXT, title_key TEXT, location TEXT, location_key TEXT,
+                    day TEXT, theater TEXT, address TEXT, kind TEXT,
+                    time TEXT, minutes INTEGER, fetched_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS showtimes_title ON showtimes (title_key, location_key);
+                CREATE INDEX IF NOT EXISTS showtimes_theater ON showtimes (theater, minutes);
+            """)
+
+    def replace(self, title, location, showtimes):
+        """Replace everything stored for title/location with a SerpAPI `showtimes` block."""
+        title_key, location_key = _key(title), _key(location)
+        now = time.time()
+        rows = [
+            (title, title_key, location, location_key, day.get("day", ""), theater.get("name", "Unknown Theater"),
+             theater.get("address", ""), showing.get("type", ""), showtime, parse_time(showtime), now)
+            for day in showtimes or []
+            for theater in day.get("theaters", [])
+            for showing in theater.get("showing", [])
+            for showtime in showing.get("time", [])
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM showtimes WHERE title_key = ? AND location_key = ?", (title_key, location_key)
+            )
+            if self.max_age is not None:
+                self._conn.execute("DELETE FROM showtimes WHERE fetched_at < ?", (now - self.max_age,))
+            self._conn.executemany("INSERT INTO showtimes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def query(self, title=None, location=None, theater=None, day=None, after=None, limit=50):
+        clauses, params = [], []
+        for column, value in (("title_key", title), ("location_key", location)):
+            if value:
+                clauses.append(f"{column} LIKE ?")
+                params.append(f"%{_key(value)}%")
+        if theater:
+            clauses.append("LOWER(theater) LIKE ?")
+            params.append(f"%{str(theater).casefold()}%")
+        if day:
+            clauses.append("LOWER(day) LIKE ?")
+            params.append(f"%{str(day).casefold()}%")
+        if (minutes := parse_time(after)) is not None:
+            clauses.append("minutes > ?")
+            params.append(minutes)
+        if self.max_age is not None:
+            clauses.append("fetched_at >= ?")
+            params.append(time.time() - self.max_age)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT title, location, day, theater, kind, time FROM showtimes {where} "
+                "ORDER BY title, rowid LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def purge_older_than(self, max_age):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM showtimes WHERE fetched_at < ?", (time.time() - max_age,))
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+import metrics
+
+# Tokens are sent to the websocket in batches: at most this long after the
+# first buffered token, or as soon as this many characters are waiting. The
+# first token is always sent right away so time-to-first-token is unaffected.
+STREAM_FLUSH_INTERVAL_MS = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "64"))
+
+
+class BufferedStreamer:
+    def __init__(self, message, interval_ms=None, max_chars=None):
+        self.message = message
+        self.interval = (STREAM_FLUSH_INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+        self.max_chars = STREAM_FLUSH_CHARS if max_chars is None else max_chars
+        self.flushes = 0
+        self._buffer = []
+        self._size = 0
+        self._last_flush = None
+        self._timer = None
+        self._timer_task = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, token):
+        self._buffer.append(token)
+        self._size += len(token)
+        if (
+            self._last_flush is None
+            or self._size >= self.max_chars
+            or time.monotonic() - self._last_flush >= self.interval
+        ):
+            await self.flush()
+        elif self._timer is None:
+            # The stream may pause (tool-call deltas, a slow model), so the
+            # interval is enforced by a timer rather than by the next token.
+            delay = self.interval - (time.monotonic() - self._last_flush)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._flush_later)
+
+    def _flush_later(self):
+        self._timer = None
+        self._timer_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        self._cancel_timer()
+        # Buffers are taken under the lock so a timer flush and an inline one
+        # can never send chunks out of order.
+        async with self._lock:
+            if not self._buffer:
+                return
+            chunk = "".join(self._buffer)
+            self._buffer.clear()
+            self._size = 0
+            self._last_flush = time.monotonic()
+            self.flushes += 1
+            if self.flushes == 1:
+                metrics.record_first_token()
+            await self.message.stream_token(chunk)
+
+    def cancel(self):
+        """Drop buffered tokens and any pending timed flush."""
+        self._cancel_timer()
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+        self._buffer.clear()
+        self._size = 0
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,275 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# The cache entries read while answering a turn, so a stored answer can be
+# thrown away as soon as any of the data behind it changes.
+_dependencies = contextvars.ContextVar("cache_dependencies", default=None)
+
+
+class Dependencies:
+    def __init__(self):
+        self.versions = {}
+        self.cacheable = True
+
+    def record(self, key, version):
+        if version is None:
+            self.cacheable = False
+        else:
+            self.versions[key] = version
+
+    def merge(self, other):
+        self.versions.update(other.versions)
+        self.cacheable = self.cacheable and other.cacheable
+
+
+def record_dependency(key, version):
+    if (dependencies := _dependencies.get()) is not None:
+        dependencies.record(key, version)
+
+
+def record_dependencies(other):
+    if (dependencies := _dependencies.get()) is not None:
+        dependencies.merge(other)
+
+
+def mark_uncacheable():
+    if (dependencies := _dependencies.get()) is not None:
+        dependencies.cacheable = False
+
+
+@contextlib.contextmanager
+def track_dependencies():
+    """Collect the dependencies recorded inside the block, and pass them on
+    to any enclosing block as well."""
+    dependencies = Dependencies()
+    token = _dependencies.set(dependencies)
+    try:
+        yield dependencies
+    finally:
+        _dependencies.reset(token)
+        record_dependencies(dependencies)
+
+
+class SQLiteBackend:
+    """On-disk second tier so warm upstream data survives restarts."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key, expires_at, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value)),
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self, now=None):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now or time.time(),))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+
+class TTLCache:
+    """Bounded LRU cache with a TTL per entry and an optional persistent backend.
+
+    The a-prefixed methods do the backend's I/O in a worker thread so async
+    callers never wait on disk. Backend rows expired for longer than
+    keep_stale are purged every purge_interval seconds on write.
+    """
+
+    def __init__(self, maxsize=512, backend=None, purge_interval=300, keep_stale=24 * 60 * 60):
+        self.maxsize = maxsize
+        self.backend = backend
+        self.purge_interval = purge_interval
+        self.keep_stale = keep_stale
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        value = self._get_fresh(key)
+        if value is MISSING and self.backend is not None:
+            value = self._load(key, self.backend.get(key))
+        return self._count(value, default)
+
+    async def aget(self, key, default=MISSING):
+        value = self._get_fresh(key)
+        if value is MISSING and self.backend is not None:
+            value = self._load(key, await asyncio.to_thread(self.backend.get, key))
+        return self._count(value, default)
+
+    def get_stale(self, key, default=MISSING):
+        """Return the last stored value even if it has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                return stored[1]
+        return default
+
+    async def aget_stale(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        if self.backend is not None:
+            stored = await asyncio.to_thread(self.backend.get, key)
+            if stored is not None:
+                return stored[1]
+        return default
+
+    def peek(self, key, default=MISSING):
+        """Return a fresh in-memory value without touching LRU order or stats."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return default
+
+    def expires_at(self, key):
+        """Expiry time of a fresh in-memory entry, which doubles as its version."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[0]
+        return None
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put(key, expires_at, value)
+        if self.backend is not None:
+            self._write(key, expires_at, value)
+
+    async def aset(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._put(key, expires_at, value)
+        if self.backend is not None:
+            await asyncio.to_thread(self._write, key, expires_at, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _get_fresh(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            # Expired entries stay until evicted so get_stale can still use them.
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                return entry[1]
+        return MISSING
+
+    def _load(self, key, stored):
+        if stored is None or stored[0] <= time.time():
+            return MISSING
+        with self._lock:
+            self._put(key, stored[0], stored[1])
+        return stored[1]
+
+    def _count(self, value, default):
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def _write(self, key, expires_at, value):
+        self.backend.set(key, expires_at, value)
+        now = time.time()
+        if now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            # Expired rows are kept a while longer for the stale fallback.
+            self.backend.purge_expired(now - self.keep_stale)
+
+    def _put(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        # Shielded so one caller giving up does not cancel everyone else's result.
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,171 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+import metrics
+from tool_cache import TTLCache, MISSING, mark_uncacheable, record_dependencies, track_dependencies
+
+JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "object": dict,
+    "array": list,
+}
+
+
+logger = logging.getLogger(__name__)
+
+
+class ToolArgumentError(ValueError):
+    pass
+
+
+@dataclass
+class Tool:
+    name: str
+    handler: object
+    description: str
+    parameters: dict = field(default_factory=lambda: {"type": "object", "properties": {}, "required": []})
+    # Seconds a result may be reused for identical arguments; None never caches.
+    cache_ttl: float = None
+    timeout: float = 30
+    # Read-only tools may be started before the model has finished streaming.
+    eager: bool = False
+    # At least one of these must be given; JSON schema "required" can't say so.
+    required_any: tuple = ()
+
+    @property
+    def argument_names(self):
+        return list(self.parameters.get("properties", {}))
+
+    def schema(self):
+        parameters = {"additionalProperties": False, **self.parameters}
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": parameters},
+        }
+
+    def signature(self):
+        return f"{self.name}({', '.join(self.argument_names)})"
+
+    def validate(self, arguments):
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"arguments for {self.name} must be an object")
+        properties = self.parameters.get("properties", {})
+        missing = [name for name in self.parameters.get("required", []) if arguments.get(name) is None]
+        if missing:
+            raise ToolArgumentError(f"missing arguments for {self.name}: {', '.join(missing)}")
+        if self.required_any and all(arguments.get(name) is None for name in self.required_any):
+            raise ToolArgumentError(f"{self.name} needs one of: {', '.join(self.required_any)}")
+        unknown = [name for name in arguments if name not in properties]
+        if unknown:
+            raise ToolArgumentError(f"unexpected arguments for {self.name}: {', '.join(unknown)}")
+        validated = {}
+        for name, value in arguments.items():
+            expected = properties[name].get("type")
+            if value is not None and expected == "integer" and isinstance(value, str) and value.strip().isdigit():
+                value = int(value)
+            elif expected == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if value is not None and expected in JSON_TYPES and not isinstance(value, JSON_TYPES[expected]):
+                raise ToolArgumentError(f"{self.name} argument {name} must be of type {expected}")
+            validated[name] = value
+        return validated
+
+    def bind(self, args, kwargs=None):
+        names = self.argument_names
+        if len(args) > len(names):
+            raise ToolArgumentError(f"{self.name} takes {len(names)} arguments but {len(args)} were given")
+        arguments = dict(zip(names, args))
+        for name, value in (kwargs or {}).items():
+            if name in arguments:
+                raise ToolArgumentError(f"{self.name} got multiple values for argument {name}")
+            arguments[name] = value
+        return arguments
+
+
+class ToolRegistry:
+    """Maps tool names to their handler, schema and dispatch policy."""
+
+    def __init__(self, cache_size=256):
+        self._tools = {}
+        self._schemas = {}
+        self.cache = TTLCache(maxsize=cache_size)
+
+    def register(self, tool):
+        self._tools[tool.name] = tool
+        self._schemas.clear()
+        return tool
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def names(self):
+        return list(self._tools)
+
+    def eager_tools(self):
+        return {name for name, tool in self._tools.items() if tool.eager}
+
+    def openai_tools(self, names=None):
+        key = tuple(names) if names is not None else None
+        if key not in self._schemas:
+            selected = names if names is not None else self._tools
+            self._schemas[key] = [self._tools[name].schema() for name in selected]
+        return self._schemas[key]
+
+    def signatures(self, names=None):
+        return "\n".join(self._tools[name].signature() for name in (names or self._tools))
+
+    async def dispatch(self, name, arguments):
+        """Run a tool and return its text result, or None for an unknown tool."""
+        tool = self._tools.get(name)
+        if tool is None:
+            return None
+        try:
+            arguments = tool.validate(arguments)
+        except ToolArgumentError as e:
+            return f"Error processing {name}: {e}"
+
+        cache_key = None
+        if tool.cache_ttl:
+            cache_key = f"{name}:{json.dumps(arguments, sort_keys=True)}"
+            cached = self.cache.get(cache_key)
+            if cached is not MISSING:
+                result, dependencies = cached
+                # Answers built on this result depend on the data behind it.
+                record_dependencies(dependencies)
+                metrics.record_tool(name, 0.0, "cached")
+                return result
+        else:
+            # Uncached tools may have side effects or read changing state.
+            mark_uncacheable()
+
+        started = time.perf_counter()
+        with track_dependencies() as dependencies:
+            try:
+                result = tool.handler(**arguments)
+                if inspect.isawaitable(result):
+                    result = await asyncio.wait_for(result, tool.timeout)
+            except asyncio.TimeoutError:
+                mark_uncacheable()
+                metrics.record_tool(name, time.perf_counter() - started, "timeout")
+                return f"Error processing {name}: timed out after {tool.timeout}s"
+            except Exception as e:
+                mark_uncacheable()
+                metrics.record_tool(name, time.perf_counter() - started, "error")
+                logger.warning("Error processing %s: %s", name, e)
+                return f"Error processing {name}: {str(e)}"
+        metrics.record_tool(name, time.perf_counter() - started, "ok")
+
+        # Handlers mark error results uncacheable; those must not outlive the outage.
+        if cache_key is not None and dependencies.cacheable:
+            self.cache.set(cache_key, (result, dependencies), tool.cache_ttl)
+        return result
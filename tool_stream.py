@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+
+class StreamedToolCall:
+    def __init__(self, index, execute):
+        self.index = index
+        self.id = None
+        self.name = ""
+        self.arguments = ""
+        self.task = None
+        self._execute = execute
+
+    def parsed_arguments(self):
+        return json.loads(self.arguments) if self.arguments else {}
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return self.task
+
+    async def result(self):
+        return await self.start()
+
+    async def _run(self):
+        try:
+            arguments = self.parsed_arguments()
+        except json.JSONDecodeError as e:
+            return f"Error parsing arguments for {self.name}: {e}"
+        return await self._execute(self.name, arguments)
+
+
+class StreamingToolExecutor:
+    """Accumulates streamed tool call deltas and starts a tool as soon as its
+    JSON arguments are complete, while the rest of the stream is still arriving.
+
+    Only tools named in `eager_tools` are started early; anything with side
+    effects waits until the caller asks for its result.
+    """
+
+    def __init__(self, execute, eager_tools=()):
+        self._execute = execute
+        self.eager_tools = set(eager_tools)
+        self.calls = {}
+
+    def add(self, delta):
+        call = self.calls.get(delta.index)
+        if call is None:
+            call = self.calls[delta.index] = StreamedToolCall(delta.index, self._execute)
+        if delta.id:
+            call.id = delta.id
+        if delta.function:
+            call.name += delta.function.name or ""
+            call.arguments += delta.function.arguments or ""
+        self._maybe_start(call)
+
+    def finish(self):
+        for call in self.calls.values():
+            self._maybe_start(call, final=True)
+        return [self.calls[index] for index in sorted(self.calls)]
+
+    def cancel(self):
+        for call in self.calls.values():
+            if call.task is not None:
+                call.task.cancel()
+
+    def _maybe_start(self, call, final=False):
+        if call.task is not None or call.name not in self.eager_tools:
+            return
+        if not final:
+            # An object only parses once its closing brace has arrived.
+            if not call.arguments.rstrip().endswith("}"):
+                return
+            try:
+                json.loads(call.arguments)
+            except json.JSONDecodeError:
+                return
+        call.start()
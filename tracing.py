@@ -0,0 +1,59 @@
+import functools
+import inspect
+import os
+
+# Fraction of turns traced to Langfuse. The Langfuse SDK reads the same
+# variable to sample traces; at 0 the decorators and the OpenAI wrapper are
+# skipped entirely so tracing costs nothing under load.
+LANGFUSE_SAMPLE_RATE = float(os.getenv("LANGFUSE_SAMPLE_RATE", "1.0"))
+TRACING_ENABLED = LANGFUSE_SAMPLE_RATE > 0
+
+# One OpenAI client per process, created on first use and shared by every
+# session, so its connection pool is reused across turns.
+_openai_client = None
+
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        # Both imports are heavy; deferring them keeps worker start fast.
+        if TRACING_ENABLED:
+            from langfuse.openai import AsyncOpenAI
+        else:
+            from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI()
+    return _openai_client
+
+
+def set_openai_client(client):
+    global _openai_client
+    _openai_client = client
+
+
+@functools.lru_cache(maxsize=None)
+def _langfuse_observe():
+    from langfuse.decorators import observe
+    return observe
+
+
+def observe(func):
+    """Langfuse @observe, with langfuse itself imported on the first call."""
+    if not TRACING_ENABLED:
+        return func
+    traced = None
+
+    def resolve():
+        nonlocal traced
+        if traced is None:
+            traced = _langfuse_observe()(func)
+        return traced
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await resolve()(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return resolve()(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+import metrics
+from rate_limit import TokenBucket
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class RetryableError(UpstreamError):
+    """A 429/5xx style failure that is worth another attempt."""
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+RETRYABLE = (RetryableError, asyncio.TimeoutError, httpx.TransportError)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Let one trial request through to see if the upstream recovered.
+            self.state = "half_open"
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def abandon(self):
+        # A cancelled trial says nothing about the upstream; let the next
+        # call try again instead of staying half open for good.
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class UpstreamPolicy:
+    """Rate limit, concurrency cap, deadline, retries, hedging and circuit
+    breaker for one upstream API."""
+
+    def __init__(self, name, rate_per_second=10, burst=None, max_concurrency=10, timeout=5, deadline=15,
+                 retries=2, backoff_base=0.25, backoff_max=2.0, hedge_after=None,
+                 failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after or None
+        self.bucket = TokenBucket(rate_per_second, capacity=burst)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "failures": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls, name, **defaults):
+        prefix = name.upper()
+        settings = dict(defaults)
+        for key, value in defaults.items():
+            if (override := os.getenv(f"{prefix}_{key.upper()}")) is not None:
+                settings[key] = type(value)(override) if value is not None else float(override)
+        return cls(name, **settings)
+
+    async def call(self, fetch):
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable")
+
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.deadline
+        error = None
+        for attempt in range(self.retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats["retries"] += 1
+            try:
+                result = await asyncio.wait_for(self._hedged(fetch), min(self.timeout, remaining))
+            except RETRYABLE as e:
+                error = e
+            except UpstreamError:
+                # The upstream answered; it just did not like the request.
+                self.breaker.record_success()
+                metrics.record_upstream(self.name, loop.time() - started, "rejected")
+                raise
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                # A malformed answer (bad JSON, undecodable body) is not worth
+                # retrying, but it still counts against the upstream.
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+                metrics.record_upstream(self.name, loop.time() - started, "failed")
+                raise UpstreamError(f"{self.name} request failed: {str(e) or type(e).__name__}") from e
+            else:
+                self.breaker.record_success()
+                metrics.record_upstream(self.name, loop.time() - started, "ok")
+                return result
+
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            await asyncio.sleep(min(random.uniform(0, backoff), max(deadline - loop.time(), 0)))
+
+        self.stats["failures"] += 1
+        self.breaker.record_failure()
+        metrics.record_upstream(self.name, loop.time() - started, "failed")
+        reason = (str(error) or type(error).__name__) if error else "deadline exceeded"
+        raise UpstreamError(f"{self.name} request failed: {reason}")
+
+    async def _attempt(self, fetch):
+        async with self.semaphore:
+            await self.bucket.acquire()
+            self.stats["attempts"] += 1
+            return await fetch()
+
+    async def _hedged(self, fetch):
+        if self.hedge_after is None:
+            return await self._attempt(fetch)
+
+        # Fire a second copy if the first is slow, and take whichever wins.
+        tasks = [asyncio.ensure_future(self._attempt(fetch))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.stats["hedges"] += 1
+                tasks.append(asyncio.ensure_future(self._attempt(fetch)))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                tasks = [task for task in tasks if not task.done()]
+                if not tasks:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()